@@ -0,0 +1,57 @@
+"""
+Message Batches API: отправка набора запросов одним batch
+Общий для ClaudeClient и SecurityAnalyzer
+"""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from ..config import LLMConfig
+
+# anthropic импортируется только при вызове: claude_client сам обрабатывает
+# его отсутствие и не должен падать на импорте этого модуля
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+logger = logging.getLogger(__name__)
+
+
+async def run_batch(client: "AsyncAnthropic", requests: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Отправляет запросы одним Message Batch и ждёт результатов
+
+    Args:
+        client: AsyncAnthropic клиент
+        requests: [{"custom_id": ..., "params": {...}}, ...]
+
+    Returns:
+        custom_id -> текст ответа (только успешные запросы)
+    """
+    if not requests:
+        return {}
+
+    from anthropic.types import TextBlock
+
+    batch = await client.messages.batches.create(requests=requests)
+    logger.info(f"Batch {batch.id}: {len(requests)} запросов")
+
+    # Опрос статуса с экспоненциальной задержкой
+    delay = LLMConfig.BATCH_POLL_INITIAL_INTERVAL
+    while batch.processing_status != "ended":
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, LLMConfig.BATCH_POLL_MAX_INTERVAL)
+        batch = await client.messages.batches.retrieve(batch.id)
+
+    texts = {}
+    async for entry in await client.messages.batches.results(batch.id):
+        if entry.result.type != "succeeded":
+            logger.warning(f"Batch запрос {entry.custom_id}: {entry.result.type}")
+            continue
+        content = entry.result.message.content
+        if content and isinstance(content[0], TextBlock):
+            texts[entry.custom_id] = content[0].text.strip()
+        else:
+            logger.warning(f"Batch запрос {entry.custom_id}: нет текстового ответа")
+
+    return texts
@@ -0,0 +1,136 @@
+"""
+Кэш ответов Claude API
+Точное совпадение: ключ - sha256 от (stage, model, temperature, system, messages)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Protocol, Tuple
+
+
+class CacheBackend(Protocol):
+    """Хранилище кэша (in-memory, файлы, Redis, ...)"""
+
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    async def set(self, key: str, value: str) -> None:
+        ...
+
+
+class MemoryBackend:
+    """In-memory LRU кэш с TTL (живёт в рамках процесса)"""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+
+class FileBackend:
+    """
+    Персистентный кэш в директории: один файл на ключ
+
+    Переживает перезапуск процесса (повторные прогоны в CI, перегенерация).
+    Запись атомарная - через временный файл и os.replace, поэтому
+    параллельные запросы не увидят недописанный ответ
+    """
+
+    def __init__(self, directory: str | Path, suffix: str = ".txt", encoding: str = "utf-8"):
+        self.directory = Path(directory)
+        self.suffix = suffix
+        self.encoding = encoding
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def _read(self, key: str) -> Optional[str]:
+        try:
+            return self._path(key).read_text(encoding=self.encoding)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, value: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding=self.encoding) as f:
+                f.write(value)
+            os.replace(tmp_name, self._path(key))
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._write, key, value)
+
+
+class LLMCache:
+    """
+    Кэш текстовых ответов LLM
+
+    Кэшировать имеет смысл только детерминированные стадии (низкая
+    temperature) - для остальных одинаковый запрос не обязан давать
+    одинаковый ответ.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(
+        stage: str,
+        model: str,
+        temperature: float,
+        system: Any,
+        messages: Any
+    ) -> str:
+        """Ключ кэша: sha256 от параметров запроса"""
+        payload = json.dumps(
+            [stage, model, temperature, system, messages],
+            ensure_ascii=False,
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        await self.backend.set(key, value)
@@ -3,38 +3,366 @@ Claude API клиент для интеллектуальной генераци
 Использует LLM для анализа промптов и создания оптимальных манифестов
 """
 
-import json
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+import re
+from contextlib import asynccontextmanager
+from functools import cache, lru_cache
+from itertools import islice
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
 from pathlib import Path
 
 try:
-    from anthropic import Anthropic, AsyncAnthropic
+    from anthropic import (
+        Anthropic,
+        APITimeoutError,
+        AsyncAnthropic,
+        DefaultAsyncHttpxClient,
+        DEFAULT_CONNECTION_LIMITS,
+        Timeout,
+    )
     from anthropic.types import Message, TextBlock
 except ImportError:
     logging.error("anthropic не установлен! Выполните: pip install anthropic")
+    DefaultAsyncHttpxClient = None
+    DEFAULT_CONNECTION_LIMITS = None
+    Timeout = None
     Anthropic = None
+    APITimeoutError = None
     AsyncAnthropic = None
     Message = None
     TextBlock = None
 
 from ..tools.telecom_generator import TelecomGenerator, TELECOM_COMPONENTS
 from ..config import LLMConfig
+from ..utils import fast_json
+from .batch import run_batch
+from .cache import LLMCache, MemoryBackend, FileBackend
 from .prompt_contexts import get_full_context, CONTEXT_5G_ARCHITECTURE, CONTEXT_KUBERNETES_BEST_PRACTICES
 
 logger = logging.getLogger(__name__)
 
+# Markdown блок кода: ```<lang>\n ... ``` или в одну строку ```<lang> ... ```
+# Закрывающий ``` необязателен - ответ мог обрезаться по max_tokens
+_FENCE_RE = re.compile(r"```([\w+-]*)[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL)
 
-# Timeout wrapper для LLM вызовов
-async def with_timeout(coro, timeout: float = 30.0):
-    """Wrapper для добавления timeout к async операциям"""
+
+# Callback для частичного текста при стриминге ответа
+PartialCallback = Callable[[str], Awaitable[None]]
+
+# Callback для готового манифеста: (имя файла, содержимое)
+ManifestCallback = Callable[[str, str], Awaitable[None]]
+
+
+# Timeout для LLM вызовов: asyncio.timeout не создаёт отдельную Task,
+# в отличие от wait_for, и корректно пробрасывает отмену
+@asynccontextmanager
+async def _deadline(timeout: float):
+    """Ограничивает время выполнения блока, по истечении - RuntimeError"""
     try:
-        return await asyncio.wait_for(coro, timeout=timeout)
-    except asyncio.TimeoutError:
+        async with asyncio.timeout(timeout):
+            yield
+    except TimeoutError:
         raise RuntimeError(f"LLM request timeout after {timeout}s")
 
 
+@asynccontextmanager
+async def _attempt_timeout(timeout: float):
+    """
+    Timeout каждой попытки запроса задаёт SDK (timeout=...); если все
+    повторы упёрлись в него - RuntimeError, как у _deadline
+    """
+    try:
+        yield
+    except APITimeoutError:
+        raise RuntimeError(
+            f"LLM request timeout after {timeout}s x {LLMConfig.MAX_RETRIES + 1} попыток"
+        )
+
+
+async def with_timeout(coro, timeout: float = 30.0):
+    """Wrapper для добавления timeout к async операциям"""
+    async with _deadline(timeout):
+        return await coro
+
+
+# Статические части system промптов (без данных конкретного запроса).
+# Собираются в ClaudeClient.__init__ и кэшируются через prompt caching,
+# динамика (компонент, контекст) идёт отдельным блоком после них
+_ANALYZE_SYSTEM_TEMPLATE = """
+Ты эксперт по телеком-инфраструктуре МТС и Kubernetes с глубокими знаниями 5G архитектуры.
+
+{full_context}
+
+Доступные телеком-компоненты:
+{components_list}
+
+Проанализируй запрос пользователя с учётом ВСЕЙ вышеуказанной информации о 5G протоколах, архитектуре и best practices.
+
+Определи:
+1. **component_type** - какой компонент нужно задеплоить (5g_upf, 5g_amf, 5g_smf, billing, etc.)
+2. **service_name** - имя сервиса (lowercase, через дефис, с регионом если указан)
+3. **region** - регион если указан (moscow, spb, ekb, etc.)
+4. **namespace** - kubernetes namespace (default: telecom)
+5. **network_interfaces** - какие 5G интерфейсы нужны (N1-N7), пустой массив если не 5G
+6. **special_requirements** - особые требования:
+   - high_throughput (>10Gbps)
+   - low_latency (<10ms)
+   - high_availability (3+ replicas)
+   - stateful (требует StatefulSet)
+   - database_required
+   - cache_required
+   - queue_required
+7. **resource_estimate** - оценка ресурсов на основе компонента и требований
+8. **security_level** - critical|high|medium|low
+9. **node_selector** - требования к нодам (если есть)
+
+Ответь ТОЛЬКО в формате JSON без дополнительного текста.
+
+Пример для "Deploy 5G UPF for Moscow with 10Gbps throughput":
+{{
+  "component_type": "5g_upf",
+  "service_name": "moscow-upf",
+  "region": "moscow",
+  "namespace": "telecom",
+  "network_interfaces": ["n3", "n4", "n6"],
+  "special_requirements": ["high_throughput", "high_availability", "low_latency"],
+  "resource_estimate": {{
+    "cpu": "8",
+    "memory": "16Gi",
+    "storage": "100Gi",
+    "storage_class": "fast-ssd"
+  }},
+  "security_level": "critical",
+  "node_selector": {{
+    "mts.ru/node-type": "telecom-workload",
+    "mts.ru/zone": "moscow"
+  }}
+}}
+"""
+
+_PARAMS_SYSTEM_TEMPLATE = """
+Ты эксперт по Kubernetes и телеком-инфраструктуре МТС с глубокими знаниями 5G.
+
+{context_5g}
+{context_k8s}
+
+На основе запроса пользователя и результатов анализа, определи ОПТИМАЛЬНЫЕ параметры с учётом:
+
+1. **replicas** - количество реплик:
+   - Critical services (UPF, AMF, SMF, Billing): минимум 3 для HA
+   - High load: 5-10 для throughput
+   - Development: 1-2 для экономии
+
+2. **namespace** - Kubernetes namespace (default: telecom)
+
+3. **resource_overrides** - корректировка CPU/Memory если базовая конфигурация не подходит:
+   - High throughput (>10Gbps): увеличить CPU/Memory
+   - Low latency (<10ms): fast-ssd storage
+   - Database workload: больше Memory для кэша
+
+4. **special_config** - дополнительные параметры:
+   - network_interfaces: для 5G компонентов (N1-N7)
+   - node_affinity: для размещения на специализированных нодах
+   - tolerations: если нужны tainted nodes
+   - priority_class: system-cluster-critical для critical компонентов
+
+5. **hpa_config** - HorizontalPodAutoscaler настройки если нужен autoscaling
+
+Ответь в формате JSON с конкретными значениями, готовыми к применению.
+"""
+
+_OPTIMIZE_SYSTEM_TEMPLATE = """
+Ты эксперт по Kubernetes для телеком-инфраструктуры МТС с глубокими знаниями 5G и cloud-native best practices.
+
+{context_k8s}
+
+Проанализируй и ОПТИМИЗИРУЙ манифест согласно МТС Cloud стандартам:
+
+1. **Labels** - добавь ОБЯЗАТЕЛЬНЫЕ МТС labels:
+   - app: <name>
+   - component: <type>
+   - tier: control-plane|user-plane|backend
+   - mts.ru/team: telecom
+   - mts.ru/criticality: critical|high|medium|low
+   - version: <semantic-version>
+
+2. **Annotations** - добавь для observability:
+   - mts.ru/owner: telecom-team@mts.ru
+   - prometheus.io/scrape: "true"
+   - prometheus.io/port: "8080"
+   - prometheus.io/path: "/metrics"
+
+3. **Security Context** - убедись что:
+   - runAsNonRoot: true (кроме UPF)
+   - readOnlyRootFilesystem: true (где возможно)
+   - capabilities: drop ALL, add только необходимые
+   - seccompProfile: RuntimeDefault
+
+4. **Health Checks** - проверь корректность:
+   - livenessProbe с правильными intervals
+   - readinessProbe для LB
+   - startupProbe для медленного старта
+
+5. **Resource Limits** - проверь:
+   - requests заданы
+   - limits = requests * 1.5
+   - Для critical: гарантированный QoS
+
+6. **High Availability** - добавь если critical:
+   - PodAntiAffinity для разных нод
+   - topologySpreadConstraints
+
+7. **Node Placement** - добавь селекторы:
+   - nodeSelector для специализированных нод
+   - tolerations если нужны
+
+ВАЖНО:
+- Верни ТОЛЬКО валидный YAML без дополнительного текста и markdown блоков
+- НЕ УДАЛЯЙ существующие важные настройки (Multus CNI, volumes, env vars)
+- СОХРАНИ все комментарии если они есть
+- Если манифест уже оптимален - верни его как есть
+"""
+
+
+# Динамические хвосты system промптов (данные конкретного запроса)
+_PARAMS_TAIL_TEMPLATE = """
+Компонент: {component_type}
+
+Базовая конфигурация:
+{base_config}
+"""
+
+_OPTIMIZE_TAIL_TEMPLATE = """
+Компонент: {component_type}
+Контекст: {context}
+"""
+
+_DOCUMENTATION_SYSTEM_PROMPT = """
+Ты технический писатель для МТС, специализирующийся на документации деплоев.
+
+Создай RUNBOOK (пошаговую инструкцию) для production деплоя.
+
+Структура:
+1. **Описание компонента** - что делает, зачем нужен
+2. **Prerequisites** - что нужно перед деплоем
+3. **Deployment Steps** - пошаговые инструкции
+4. **Verification** - как проверить что работает
+5. **Monitoring** - что мониторить
+6. **Troubleshooting** - частые проблемы и решения
+7. **Rollback Procedure** - как откатить изменения
+
+Формат: Markdown
+Стиль: Четкий, конкретный, для инженеров МТС
+"""
+
+_CICD_SYSTEM_TEMPLATE = """
+Ты DevOps эксперт для МТС.
+
+Создай CI/CD pipeline для {platform} ({project_type} проект).
+
+Требования:
+1. Stages: build, test, {security_stage}deploy
+2. Docker сборка с кэшированием
+3. Автотесты с coverage
+4. {security_scan}
+5. Деплой в K8s (staging + production)
+6. Интеграция с MTS Cloud registry
+
+Формат: YAML для {platform}
+Стиль: Production-ready, с комментариями
+"""
+
+# Признаки манифеста, уже приведённого к МТС стандартам (см. промпт
+# оптимизации) - такие манифесты не отправляются в LLM
+_REQUIRED_MARKERS = ("mts.ru/team", "mts.ru/criticality", "mts.ru/owner")
+_WORKLOAD_MARKERS = ("resources:", "securityContext:", "livenessProbe:", "readinessProbe:")
+
+
+@cache
+def _shared_http_client() -> Any:
+    """
+    Общий HTTP клиент для всех ClaudeClient
+
+    Пул соединений (и TLS сессии) переиспользуется между клиентами и
+    запросами; лимиты пула рассчитаны на параллельную оптимизацию манифестов
+    """
+    # Класс Limits берём у SDK, а не из httpx напрямую: anthropic может
+    # использовать собственную сборку httpx
+    limits_cls = type(DEFAULT_CONNECTION_LIMITS)
+    return DefaultAsyncHttpxClient(
+        limits=limits_cls(
+            max_connections=LLMConfig.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLMConfig.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLMConfig.HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=Timeout(60.0, connect=10.0)
+    )
+
+
+async def close_shared_http_client() -> None:
+    """
+    Закрывает общий HTTP клиент, если он был создан
+
+    Кэш сбрасывается вместе с закрытием: следующий ClaudeClient получит
+    новый пул, а не закрытый
+    """
+    if not _shared_http_client.cache_info().currsize:
+        return
+    http_client = _shared_http_client()
+    _shared_http_client.cache_clear()
+    await http_client.aclose()
+
+
+@cache
+def _format_components_list() -> str:
+    """Форматирует список компонентов для LLM"""
+    return "\n".join(
+        f"- {comp_type}: {config.get('description', '')}"
+        for comp_type, config in TELECOM_COMPONENTS.items()
+    )
+
+
+@lru_cache(maxsize=64)
+def _component_config_json(component_type: str) -> str:
+    """Базовая конфигурация компонента в JSON (для промпта параметров)"""
+    return fast_json.dumps_pretty(TELECOM_COMPONENTS.get(component_type, {}))
+
+
+@lru_cache(maxsize=64)
+def _params_dynamic_tail(component_type: str) -> str:
+    """Хвост промпта параметров - зависит только от типа компонента"""
+    return _PARAMS_TAIL_TEMPLATE.format(
+        component_type=component_type,
+        base_config=_component_config_json(component_type)
+    )
+
+
+@lru_cache(maxsize=32)
+def _cicd_system_prompt(platform: str, project_type: str, include_security: bool) -> str:
+    """System промпт CI/CD для набора параметров"""
+    return _CICD_SYSTEM_TEMPLATE.format(
+        platform=platform,
+        project_type=project_type,
+        security_stage="security, " if include_security else "",
+        security_scan="Security сканирование (Trivy)" if include_security else ""
+    )
+
+
+@cache
+def _analyze_system_prompt() -> str:
+    """
+    Статический system промпт анализа
+
+    Полный контекст и список компонентов - константы модулей, поэтому
+    промпт собирается один раз на процесс, а не для каждого клиента
+    """
+    return _ANALYZE_SYSTEM_TEMPLATE.format(
+        full_context=get_full_context(),
+        components_list=_format_components_list()
+    )
+
+
 class ClaudeClient:
     """
     Клиент для работы с Claude API
@@ -48,22 +376,128 @@ class ClaudeClient:
         if not AsyncAnthropic:
             raise ImportError("Установите anthropic: pip install anthropic")
 
-        self.client = AsyncAnthropic(api_key=api_key)
+        self.client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=_shared_http_client(),
+            max_retries=LLMConfig.MAX_RETRIES
+        )
         self.telecom_gen = TelecomGenerator()
         self.model = LLMConfig.MODEL
 
+        # Ограничение параллельных запросов к Claude API (rate limits)
+        self._semaphore = asyncio.Semaphore(LLMConfig.MAX_CONCURRENT_REQUESTS)
+
+        # Кэш ответов для детерминированных стадий (оптимизация манифестов):
+        # на диске если включён LLM_OPT_CACHE, иначе в памяти процесса
+        if LLMConfig.ENABLE_OPT_CACHE:
+            backend = FileBackend(LLMConfig.OPT_CACHE_DIR, suffix=".yaml")
+        else:
+            backend = MemoryBackend(max_entries=LLMConfig.RESPONSE_CACHE_SIZE)
+        self.cache = LLMCache(backend)
+
+        # Статические части system промптов не меняются между запросами:
+        # собираем их один раз и помечаем для prompt caching на стороне API
+        self._analyze_system_cached = self._cached_block(_analyze_system_prompt())
+        self._params_system_cached = self._cached_block(
+            _PARAMS_SYSTEM_TEMPLATE.format(
+                context_5g=CONTEXT_5G_ARCHITECTURE,
+                context_k8s=CONTEXT_KUBERNETES_BEST_PRACTICES
+            )
+        )
+        self._optimize_system_cached = self._cached_block(
+            _OPTIMIZE_SYSTEM_TEMPLATE.format(
+                context_k8s=CONTEXT_KUBERNETES_BEST_PRACTICES
+            )
+        )
+
+    @staticmethod
+    def _cached_block(text: str) -> Dict[str, Any]:
+        """Текстовый блок system промпта с пометкой для prompt caching"""
+        return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+    @staticmethod
+    def _system(cached_block: Dict[str, Any], dynamic_tail: str | None = None) -> list:
+        """
+        Собирает system промпт: сначала кэшируемый статический префикс,
+        затем (опционально) динамический хвост, который в кэш не попадает
+        """
+        if dynamic_tail is None:
+            return [cached_block]
+        return [cached_block, {"type": "text", "text": dynamic_tail}]
+
+    async def _create_message(self, timeout: float = 30.0, **kwargs: Any) -> Any:
+        """
+        Вызов messages.create с ограничением параллелизма и timeout
+
+        Не больше LLMConfig.MAX_CONCURRENT_REQUESTS одновременных запросов;
+        время ожидания в очереди в timeout не входит. timeout действует на
+        каждую попытку отдельно: повторы при 429/5xx, сетевых ошибках и
+        timeout (экспоненциальный backoff с jitter, с учётом retry-after)
+        делает сам SDK - см. max_retries в __init__
+        """
+        async with self._semaphore, _attempt_timeout(timeout):
+            return await self.client.messages.create(timeout=timeout, **kwargs)
+
+    async def _stream_text(
+        self,
+        on_partial: Optional[PartialCallback] = None,
+        timeout: float = 30.0,
+        **kwargs: Any
+    ) -> str:
+        """
+        Стриминговый вызов messages.stream - возвращает собранный текст
+
+        Каждый пришедший фрагмент передаётся в on_partial, чтобы вызывающий
+        код мог отдавать/писать результат, не дожидаясь конца генерации.
+        timeout - на попытку (как в _create_message), а не на всю генерацию
+        """
+        chunks = []
+        async with self._semaphore, _attempt_timeout(timeout):
+            async with self.client.messages.stream(timeout=timeout, **kwargs) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    if on_partial is not None:
+                        await on_partial(text)
+
+        text = "".join(chunks)
+        if not text:
+            raise ValueError("Empty response from Claude API")
+        return text.strip()
+
+    @staticmethod
+    def _extract_text(response: Any) -> str:
+        """Безопасно извлекает текст первого блока ответа Claude"""
+        blocks = response.content
+        if not blocks:
+            raise ValueError("Empty response from Claude API")
+
+        block = blocks[0]
+        if isinstance(block, TextBlock):
+            return block.text.strip()
+        raise ValueError(f"Unexpected content type: {type(block).__name__}")
+
     def _extract_code_block(self, content: str, lang: str | None = None) -> str:
-        """Извлекает код из markdown блока"""
-        if lang and f"```{lang}" in content:
-            return content.split(f"```{lang}")[1].split("```")[0].strip()
-        elif "```" in content:
-            return content.split("```")[1].split("```")[0].strip()
+        """
+        Извлекает код из markdown блока
+
+        Возвращает первый блок с языком lang, иначе первый блок любого
+        языка, иначе весь текст
+        """
+        first = None
+        for match in _FENCE_RE.finditer(content):
+            if lang is None or match.group(1) == lang:
+                return match.group(2).strip()
+            if first is None:
+                first = match
+        if first is not None:
+            return first.group(2).strip()
         return content.strip()
 
     async def generate_telecom_deployment(
         self,
         prompt: str,
-        output_dir: str = "./output"
+        output_dir: str = "./output",
+        on_manifest: Optional[ManifestCallback] = None
     ) -> Dict[str, Any]:
         """
         Главная функция: генерирует полный деплоймент по промпту
@@ -71,6 +505,8 @@ class ClaudeClient:
         Args:
             prompt: Описание что нужно задеплоить
             output_dir: Директория для сохранения
+            on_manifest: Callback для каждого манифеста сразу как он готов -
+                позволяет сохранять файлы, пока остальные ещё оптимизируются
 
         Returns:
             {
@@ -82,7 +518,7 @@ class ClaudeClient:
         logger.info(f"🤖 Анализ промпта: {prompt}")
 
         # Шаг 1: Анализ промпта
-        analysis = await self._analyze_prompt(prompt)
+        analysis, analysis_json = await self._analyze_prompt(prompt)
         logger.info(f"📊 Определен компонент: {analysis.get('component_type')}")
 
         # Шаг 2: Генерация параметров
@@ -99,148 +535,209 @@ class ClaudeClient:
             namespace=params.get("namespace", "telecom")
         )
 
-        # Шаг 4: Оптимизация манифестов через LLM
-        optimized_manifests = {}
-        for filename, content in manifests.items():
-            logger.info(f" Оптимизация {filename}...")
-            optimized = await self._optimize_manifest(content, prompt, component_type)
-            optimized_manifests[filename] = optimized
-
-        # Шаг 5: Генерация документации
-        documentation = await self._generate_documentation(
-            component_type=component_type,
-            service_name=service_name,
-            manifests=optimized_manifests,
-            prompt=prompt
+        # Шаг 4: Документация не зависит от результата оптимизации (в промпт
+        # идут только первые 500 символов манифестов), поэтому запускаем её
+        # сразу по исходным манифестам, параллельно с оптимизацией
+        doc_task = asyncio.create_task(
+            self._generate_documentation(
+                component_type=component_type,
+                service_name=service_name,
+                manifests=manifests,
+                prompt=prompt
+            )
         )
 
+        # Шаг 5: Оптимизация манифестов через LLM (параллельно, число
+        # одновременных запросов ограничивает _create_message)
+        # Манифесты, уже соответствующие стандартам, в LLM не отправляем
+        filenames = {name for name, content in manifests.items() if self._needs_optimization(content)}
+        logger.info(f" Оптимизация манифестов: {', '.join(filenames) or 'не требуется'}")
+
+        optimized_manifests = dict(manifests)
+
+        async def finish(filename: str) -> None:
+            content = manifests[filename]
+            if filename in filenames:
+                try:
+                    content = await self._optimize_manifest(content, prompt, component_type)
+                except Exception as e:
+                    logger.warning(f"Ошибка оптимизации {filename}: {e}. Возвращаю оригинал.")
+                optimized_manifests[filename] = content
+            if on_manifest is not None:
+                await on_manifest(filename, content)
+
+        try:
+            await asyncio.gather(*(finish(filename) for filename in manifests))
+        except BaseException:
+            doc_task.cancel()
+            raise
+
+        documentation = await doc_task
+
         return {
             "manifests": optimized_manifests,
             "documentation": documentation,
-            "analysis": json.dumps(analysis, indent=2, ensure_ascii=False)
+            "analysis": analysis_json
         }
 
-    async def _analyze_prompt(self, prompt: str) -> Dict[str, Any]:
+    async def generate_telecom_deployment_batch(
+        self,
+        prompts: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Пакетная генерация деплойментов через Message Batches API
+
+        Для офлайн сценариев (ночная перегенерация, массовые прогоны):
+        анализ и параметры идут обычными запросами - от них зависит
+        рендеринг шаблонов; оптимизация манифестов и документация всех
+        промптов отправляются одним batch'ем (в 2 раза дешевле, но ответ
+        может прийти только через несколько часов)
+
+        Args:
+            prompts: Описания деплойментов
+
+        Returns:
+            Список результатов в порядке prompts, формат как у
+            generate_telecom_deployment
+        """
+        analyses = await asyncio.gather(*(self._analyze_prompt(prompt) for prompt in prompts))
+        params_list = await asyncio.gather(
+            *(
+                self._generate_parameters(prompt, analysis)
+                for prompt, (analysis, _) in zip(prompts, analyses)
+            )
+        )
+
+        deployments = []
+        requests = []
+        # custom_id -> (индекс деплоймента, имя манифеста или None для документации, ключ кэша)
+        pending: Dict[str, Tuple[int, Optional[str], Optional[str]]] = {}
+
+        for index, (prompt, (analysis, analysis_json), params) in enumerate(
+            zip(prompts, analyses, params_list)
+        ):
+            component_type = analysis.get("component_type", "generic")
+            service_name = params.get("service_name", "telecom-service")
+
+            manifests = self.telecom_gen.generate_full_stack(
+                component_type=component_type,
+                service_name=service_name,
+                namespace=params.get("namespace", "telecom")
+            )
+            deployment = {
+                "manifests": dict(manifests),
+                "documentation": None,
+                "analysis": analysis_json
+            }
+            deployments.append((deployment, component_type, service_name))
+
+            for position, (filename, manifest) in enumerate(manifests.items()):
+                if not self._needs_optimization(manifest):
+                    continue
+
+                request = self._optimize_request(manifest, prompt, component_type)
+                cache_key = self._request_cache_key("optimize", request)
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    deployment["manifests"][filename] = cached
+                    continue
+
+                # custom_id: только [a-zA-Z0-9_-], поэтому индексы вместо имён файлов
+                custom_id = f"deploy-{index}-manifest-{position}"
+                requests.append({"custom_id": custom_id, "params": request})
+                pending[custom_id] = (index, filename, cache_key)
+
+            custom_id = f"deploy-{index}-docs"
+            requests.append({
+                "custom_id": custom_id,
+                "params": self._documentation_request(component_type, service_name, manifests, prompt)
+            })
+            pending[custom_id] = (index, None, None)
+
+        texts = await run_batch(self.client, requests)
+
+        for custom_id, (index, filename, cache_key) in pending.items():
+            deployment, component_type, service_name = deployments[index]
+            text = texts.get(custom_id)
+
+            if filename is None:
+                deployment["documentation"] = text or self._generate_fallback_documentation(
+                    component_type, service_name, TELECOM_COMPONENTS.get(component_type, {})
+                )
+            elif text:
+                optimized = self._extract_code_block(text, "yaml")
+                deployment["manifests"][filename] = optimized
+                await self.cache.set(cache_key, optimized)
+            # иначе остаётся исходный манифест
+
+        return [deployment for deployment, _, _ in deployments]
+
+    async def _analyze_prompt(self, prompt: str) -> Tuple[Dict[str, Any], str]:
         """
         LLM анализирует промпт и определяет компонент
 
         Returns:
-            {
+            (анализ, его JSON текст) - валидный ответ LLM отдаётся как есть,
+            без повторной сериализации; починенный - сериализуется заново:
+            ({
                 'component_type': '5g_upf',
                 'region': 'moscow',
                 'requirements': [...],
                 'service_name': 'moscow-upf'
-            }
+            }, '{...}')
         """
-        # Получить ПОЛНЫЙ контекст для максимальной точности
-        full_context = get_full_context()
-
-        system_prompt = f"""
-Ты эксперт по телеком-инфраструктуре МТС и Kubernetes с глубокими знаниями 5G архитектуры.
-
-{full_context}
-
-Доступные телеком-компоненты:
-{self._format_components_list()}
-
-Проанализируй запрос пользователя с учётом ВСЕЙ вышеуказанной информации о 5G протоколах, архитектуре и best practices.
-
-Определи:
-1. **component_type** - какой компонент нужно задеплоить (5g_upf, 5g_amf, 5g_smf, billing, etc.)
-2. **service_name** - имя сервиса (lowercase, через дефис, с регионом если указан)
-3. **region** - регион если указан (moscow, spb, ekb, etc.)
-4. **namespace** - kubernetes namespace (default: telecom)
-5. **network_interfaces** - какие 5G интерфейсы нужны (N1-N7), пустой массив если не 5G
-6. **special_requirements** - особые требования:
-   - high_throughput (>10Gbps)
-   - low_latency (<10ms)
-   - high_availability (3+ replicas)
-   - stateful (требует StatefulSet)
-   - database_required
-   - cache_required
-   - queue_required
-7. **resource_estimate** - оценка ресурсов на основе компонента и требований
-8. **security_level** - critical|high|medium|low
-9. **node_selector** - требования к нодам (если есть)
-
-Ответь ТОЛЬКО в формате JSON без дополнительного текста.
-
-Пример для "Deploy 5G UPF for Moscow with 10Gbps throughput":
-{{
-  "component_type": "5g_upf",
-  "service_name": "moscow-upf",
-  "region": "moscow",
-  "namespace": "telecom",
-  "network_interfaces": ["n3", "n4", "n6"],
-  "special_requirements": ["high_throughput", "high_availability", "low_latency"],
-  "resource_estimate": {{
-    "cpu": "8",
-    "memory": "16Gi",
-    "storage": "100Gi",
-    "storage_class": "fast-ssd"
-  }},
-  "security_level": "critical",
-  "node_selector": {{
-    "mts.ru/node-type": "telecom-workload",
-    "mts.ru/zone": "moscow"
-  }}
-}}
-"""
-
         try:
-            response = await with_timeout(
-                self.client.messages.create(
-                    model=self.model,
-                    max_tokens=LLMConfig.TOKENS_ANALYSIS,
-                    temperature=LLMConfig.TEMP_BALANCED,
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": f"Запрос: {prompt}"
-                    }]
-                ),
-                timeout=30.0
+            response = await self._create_message(
+                model=self.model,
+                max_tokens=LLMConfig.TOKENS_ANALYSIS,
+                temperature=LLMConfig.TEMP_BALANCED,
+                system=self._system(self._analyze_system_cached),
+                messages=[{
+                    "role": "user",
+                    "content": f"Запрос: {prompt}"
+                }]
             )
 
             # Безопасное извлечение текста из ответа
-            if not response.content:
-                raise ValueError("Empty response from Claude API")
-
-            first_block = response.content[0]
-            if hasattr(first_block, 'text'):
-                content = first_block.text.strip()
-            else:
-                raise ValueError(f"Unexpected content type: {type(first_block)}")
+            content = self._extract_text(response)
 
             # Извлечь JSON из ответа
             content = self._extract_code_block(content, "json")
 
-            analysis = json.loads(content)
-            return analysis
-
-        except json.JSONDecodeError as e:
+            try:
+                analysis = await fast_json.aloads(content)
+            except fast_json.JSONDecodeError:
+                # Ответ разобран только после починки - исходный текст
+                # невалиден, отдаём заново сериализованный JSON
+                analysis = await fast_json.aloads(content, lenient=True)
+                content = fast_json.dumps_pretty(analysis)
+            return analysis, content
+
+        except fast_json.JSONDecodeError as e:
             logger.error(f"Ошибка парсинга JSON от LLM: {e}")
             logger.debug(f"Полученный контент: {content[:200] if 'content' in locals() else 'N/A'}")
             # Fallback: простая эвристика
             component_type = self.telecom_gen.identify_component(prompt)
-            return {
+            analysis = {
                 "component_type": component_type,
                 "service_name": f"{component_type}-service",
                 "namespace": "telecom",
                 "special_requirements": []
             }
+            return analysis, fast_json.dumps_pretty(analysis)
         except Exception as e:
             logger.error(f"Критическая ошибка анализа промпта: {e}", exc_info=True)
             logger.warning("Переключение на fallback режим")
             # Fallback: простая эвристика
             component_type = self.telecom_gen.identify_component(prompt)
-            return {
+            analysis = {
                 "component_type": component_type,
                 "service_name": f"{component_type}-service",
                 "namespace": "telecom",
                 "special_requirements": [],
                 "error": str(e)
             }
+            return analysis, fast_json.dumps_pretty(analysis)
 
     async def _generate_parameters(
         self,
@@ -261,71 +758,25 @@ class ClaudeClient:
         component_type = analysis.get("component_type", "generic")
         base_config = TELECOM_COMPONENTS.get(component_type, {})
 
-        system_prompt = f"""
-Ты эксперт по Kubernetes и телеком-инфраструктуре МТС с глубокими знаниями 5G.
-
-{CONTEXT_5G_ARCHITECTURE}
-{CONTEXT_KUBERNETES_BEST_PRACTICES}
-
-Компонент: {component_type}
-
-Базовая конфигурация:
-{json.dumps(base_config, indent=2, ensure_ascii=False)}
-
-На основе запроса пользователя и результатов анализа, определи ОПТИМАЛЬНЫЕ параметры с учётом:
-
-1. **replicas** - количество реплик:
-   - Critical services (UPF, AMF, SMF, Billing): минимум 3 для HA
-   - High load: 5-10 для throughput
-   - Development: 1-2 для экономии
-
-2. **namespace** - Kubernetes namespace (default: telecom)
-
-3. **resource_overrides** - корректировка CPU/Memory если базовая конфигурация не подходит:
-   - High throughput (>10Gbps): увеличить CPU/Memory
-   - Low latency (<10ms): fast-ssd storage
-   - Database workload: больше Memory для кэша
-
-4. **special_config** - дополнительные параметры:
-   - network_interfaces: для 5G компонентов (N1-N7)
-   - node_affinity: для размещения на специализированных нодах
-   - tolerations: если нужны tainted nodes
-   - priority_class: system-cluster-critical для critical компонентов
-
-5. **hpa_config** - HorizontalPodAutoscaler настройки если нужен autoscaling
-
-Ответь в формате JSON с конкретными значениями, готовыми к применению.
-"""
-
         try:
-            response = await with_timeout(
-                self.client.messages.create(
-                    model=self.model,
-                    max_tokens=LLMConfig.TOKENS_PARAMETERS,
-                    temperature=LLMConfig.TEMP_BALANCED,
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": f"Запрос: {prompt}\n\nАнализ: {json.dumps(analysis, ensure_ascii=False)}"
-                    }]
-                ),
-                timeout=30.0
+            response = await self._create_message(
+                model=self.model,
+                max_tokens=LLMConfig.TOKENS_PARAMETERS,
+                temperature=LLMConfig.TEMP_BALANCED,
+                system=self._system(self._params_system_cached, _params_dynamic_tail(component_type)),
+                messages=[{
+                    "role": "user",
+                    "content": f"Запрос: {prompt}\n\nАнализ: {fast_json.dumps(analysis)}"
+                }]
             )
 
             # Безопасное извлечение текста
-            if not response.content:
-                raise ValueError("Empty response from Claude API")
-
-            first_block = response.content[0]
-            if hasattr(first_block, 'text'):
-                content = first_block.text.strip()
-            else:
-                raise ValueError(f"Unexpected content type: {type(first_block)}")
+            content = self._extract_text(response)
 
             # Извлечь JSON
             content = self._extract_code_block(content, "json")
 
-            params = json.loads(content)
+            params = await fast_json.aloads(content, lenient=True)
 
             # Добавить service_name из analysis
             params["service_name"] = analysis.get("service_name", "telecom-service")
@@ -333,7 +784,7 @@ class ClaudeClient:
 
             return params
 
-        except json.JSONDecodeError as e:
+        except fast_json.JSONDecodeError as e:
             logger.error(f"Ошибка парсинга JSON параметров: {e}")
             logger.debug(f"Полученный контент: {content[:200] if 'content' in locals() else 'N/A'}")
             return {
@@ -351,6 +802,49 @@ class ClaudeClient:
                 "error": str(e)
             }
 
+    @staticmethod
+    def _needs_optimization(manifest: str) -> bool:
+        """
+        Быстрая проверка, нужна ли манифесту оптимизация через LLM
+
+        Манифест считается соответствующим МТС стандартам, если в нём есть
+        обязательные labels/annotations, а для workload'ов (с контейнерами)
+        ещё resources, securityContext и health checks
+        """
+        if not all(marker in manifest for marker in _REQUIRED_MARKERS):
+            return True
+        if "containers:" in manifest:
+            return not all(marker in manifest for marker in _WORKLOAD_MARKERS)
+        return False
+
+    def _optimize_request(
+        self,
+        manifest: str,
+        context: str,
+        component_type: str
+    ) -> Dict[str, Any]:
+        """Параметры messages.create для оптимизации манифеста"""
+        dynamic_tail = _OPTIMIZE_TAIL_TEMPLATE.format(
+            component_type=component_type,
+            context=context
+        )
+        return {
+            "model": self.model,
+            "max_tokens": LLMConfig.TOKENS_OPTIMIZATION,
+            "temperature": LLMConfig.TEMP_DETERMINISTIC,
+            "system": self._system(self._optimize_system_cached, dynamic_tail),
+            "messages": [{
+                "role": "user",
+                "content": f"Контекст: {context}\n\nМанифест:\n```yaml\n{manifest}\n```"
+            }]
+        }
+
+    def _request_cache_key(self, stage: str, request: Dict[str, Any]) -> str:
+        """Ключ кэша для параметров messages.create"""
+        return self.cache.cache_key(
+            stage, request["model"], request["temperature"], request["system"], request["messages"]
+        )
+
     async def _optimize_manifest(
         self,
         manifest: str,
@@ -368,143 +862,54 @@ class ClaudeClient:
         Returns:
             Оптимизированный YAML
         """
-        system_prompt = f"""
-Ты эксперт по Kubernetes для телеком-инфраструктуры МТС с глубокими знаниями 5G и cloud-native best practices.
-
-{CONTEXT_KUBERNETES_BEST_PRACTICES}
-
-Компонент: {component_type}
-Контекст: {context}
-
-Проанализируй и ОПТИМИЗИРУЙ манифест согласно МТС Cloud стандартам:
-
-1. **Labels** - добавь ОБЯЗАТЕЛЬНЫЕ МТС labels:
-   - app: <name>
-   - component: <type>
-   - tier: control-plane|user-plane|backend
-   - mts.ru/team: telecom
-   - mts.ru/criticality: critical|high|medium|low
-   - version: <semantic-version>
-
-2. **Annotations** - добавь для observability:
-   - mts.ru/owner: telecom-team@mts.ru
-   - prometheus.io/scrape: "true"
-   - prometheus.io/port: "8080"
-   - prometheus.io/path: "/metrics"
+        request = self._optimize_request(manifest, context, component_type)
 
-3. **Security Context** - убедись что:
-   - runAsNonRoot: true (кроме UPF)
-   - readOnlyRootFilesystem: true (где возможно)
-   - capabilities: drop ALL, add только необходимые
-   - seccompProfile: RuntimeDefault
-
-4. **Health Checks** - проверь корректность:
-   - livenessProbe с правильными intervals
-   - readinessProbe для LB
-   - startupProbe для медленного старта
-
-5. **Resource Limits** - проверь:
-   - requests заданы
-   - limits = requests * 1.5
-   - Для critical: гарантированный QoS
-
-6. **High Availability** - добавь если critical:
-   - PodAntiAffinity для разных нод
-   - topologySpreadConstraints
-
-7. **Node Placement** - добавь селекторы:
-   - nodeSelector для специализированных нод
-   - tolerations если нужны
-
-ВАЖНО:
-- Верни ТОЛЬКО валидный YAML без дополнительного текста и markdown блоков
-- НЕ УДАЛЯЙ существующие важные настройки (Multus CNI, volumes, env vars)
-- СОХРАНИ все комментарии если они есть
-- Если манифест уже оптимален - верни его как есть
-"""
+        # Оптимизация идёт с детерминированной temperature - одинаковый
+        # запрос можно отдавать из кэша без обращения к API
+        cache_key = self._request_cache_key("optimize", request)
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            response = await with_timeout(
-                self.client.messages.create(
-                    model=self.model,
-                    max_tokens=LLMConfig.TOKENS_OPTIMIZATION,
-                    temperature=LLMConfig.TEMP_DETERMINISTIC,
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": f"Контекст: {context}\n\nМанифест:\n```yaml\n{manifest}\n```"
-                    }]
-                ),
-                timeout=30.0
-            )
+            response = await self._create_message(**request)
 
             # Безопасное извлечение текста
-            if not response.content:
-                raise ValueError("Empty response from Claude API")
-
-            first_block = response.content[0]
-            if hasattr(first_block, 'text'):
-                optimized = first_block.text.strip()
-            else:
-                raise ValueError(f"Unexpected content type: {type(first_block)}")
+            optimized = self._extract_text(response)
 
             # Извлечь YAML
             optimized = self._extract_code_block(optimized, "yaml")
 
+            await self.cache.set(cache_key, optimized)
             return optimized
 
         except Exception as e:
             logger.warning(f"Ошибка оптимизации манифеста: {e}. Возвращаю оригинал.")
             return manifest
 
-    async def _generate_documentation(
+    def _documentation_request(
         self,
         component_type: str,
         service_name: str,
         manifests: Dict[str, str],
         prompt: str
-    ) -> str:
-        """
-        LLM генерирует runbook (документацию по деплою)
-
-        Returns:
-            Markdown документация
-        """
+    ) -> Dict[str, Any]:
+        """Параметры messages.create для генерации runbook"""
         config = TELECOM_COMPONENTS.get(component_type, {})
 
-        system_prompt = """
-Ты технический писатель для МТС, специализирующийся на документации деплоев.
-
-Создай RUNBOOK (пошаговую инструкцию) для production деплоя.
-
-Структура:
-1. **Описание компонента** - что делает, зачем нужен
-2. **Prerequisites** - что нужно перед деплоем
-3. **Deployment Steps** - пошаговые инструкции
-4. **Verification** - как проверить что работает
-5. **Monitoring** - что мониторить
-6. **Troubleshooting** - частые проблемы и решения
-7. **Rollback Procedure** - как откатить изменения
-
-Формат: Markdown
-Стиль: Четкий, конкретный, для инженеров МТС
-"""
-
-        manifests_text = "\n\n".join([
+        manifests_text = "\n\n".join(
             f"### {filename}\n```yaml\n{content[:500]}...\n```"
-            for filename, content in list(manifests.items())[:3]
-        ])
+            for filename, content in islice(manifests.items(), 3)
+        )
 
-        try:
-            response = await with_timeout(
-                self.client.messages.create(
-                    model=self.model,
-                    max_tokens=LLMConfig.TOKENS_DOCUMENTATION,
-                    temperature=LLMConfig.TEMP_CREATIVE,
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": f"""
+        return {
+            "model": self.model,
+            "max_tokens": LLMConfig.TOKENS_DOCUMENTATION,
+            "temperature": LLMConfig.TEMP_CREATIVE,
+            "system": _DOCUMENTATION_SYSTEM_PROMPT,
+            "messages": [{
+                "role": "user",
+                "content": f"""
 Компонент: {component_type}
 Имя сервиса: {service_name}
 Описание: {config.get('description', 'N/A')}
@@ -516,47 +921,61 @@ class ClaudeClient:
 
 Создай runbook для этого деплоя.
 """
-                    }]
-                ),
-                timeout=30.0
-            )
+            }]
+        }
 
-            # Безопасное извлечение текста
-            if not response.content:
-                raise ValueError("Empty response from Claude API")
+    async def _generate_documentation(
+        self,
+        component_type: str,
+        service_name: str,
+        manifests: Dict[str, str],
+        prompt: str,
+        on_partial: Optional[PartialCallback] = None
+    ) -> str:
+        """
+        LLM генерирует runbook (документацию по деплою)
 
-            first_block = response.content[0]
-            if hasattr(first_block, 'text'):
-                docs = first_block.text.strip()
-            else:
-                raise ValueError(f"Unexpected content type: {type(first_block)}")
+        Args:
+            on_partial: Callback для фрагментов текста по мере генерации
+
+        Returns:
+            Markdown документация
+        """
+        try:
+            docs = await self._stream_text(
+                on_partial,
+                **self._documentation_request(component_type, service_name, manifests, prompt)
+            )
 
             return docs
 
         except Exception as e:
             logger.error(f"Ошибка генерации документации: {e}")
             return self._generate_fallback_documentation(
-                component_type, service_name, config
+                component_type, service_name, TELECOM_COMPONENTS.get(component_type, {})
             )
 
     async def generate_documentation(
         self,
         component_type: str,
-        manifests: Dict[str, str]
+        manifests: Dict[str, str],
+        on_partial: Optional[PartialCallback] = None
     ) -> str:
         """Генерирует документацию (обертка для _generate_documentation)"""
         return await self._generate_documentation(
             component_type=component_type,
             service_name=f"{component_type}-service",
             manifests=manifests,
-            prompt=""
+            prompt="",
+            on_partial=on_partial
         )
 
     async def generate_cicd(
         self,
         platform: str,
         project_type: str,
-        include_security: bool = True
+        include_security: bool = True,
+        on_partial: Optional[PartialCallback] = None
     ) -> str:
         """
         Генерирует CI/CD pipeline используя LLM
@@ -565,52 +984,25 @@ class ClaudeClient:
             platform: 'gitlab' или 'github'
             project_type: Тип проекта
             include_security: Включить security сканирование
+            on_partial: Callback для фрагментов ответа по мере генерации
+                (сырой текст модели, может включать markdown разметку)
 
         Returns:
             YAML конфигурация
         """
-        system_prompt = f"""
-Ты DevOps эксперт для МТС.
-
-Создай CI/CD pipeline для {platform} ({project_type} проект).
-
-Требования:
-1. Stages: build, test, {'security, ' if include_security else ''}deploy
-2. Docker сборка с кэшированием
-3. Автотесты с coverage
-4. {'Security сканирование (Trivy)' if include_security else ''}
-5. Деплой в K8s (staging + production)
-6. Интеграция с MTS Cloud registry
-
-Формат: YAML для {platform}
-Стиль: Production-ready, с комментариями
-"""
-
         try:
-            response = await with_timeout(
-                self.client.messages.create(
-                    model=self.model,
-                    max_tokens=LLMConfig.TOKENS_CICD,
-                    temperature=LLMConfig.TEMP_BALANCED,
-                    system=system_prompt,
-                    messages=[{
-                        "role": "user",
-                        "content": f"Создай CI/CD для {platform}, проект: {project_type}"
-                    }]
-                ),
-                timeout=30.0
+            config = await self._stream_text(
+                on_partial,
+                model=self.model,
+                max_tokens=LLMConfig.TOKENS_CICD,
+                temperature=LLMConfig.TEMP_BALANCED,
+                system=_cicd_system_prompt(platform, project_type, include_security),
+                messages=[{
+                    "role": "user",
+                    "content": f"Создай CI/CD для {platform}, проект: {project_type}"
+                }]
             )
 
-            # Безопасное извлечение текста
-            if not response.content:
-                raise ValueError("Empty response from Claude API")
-
-            first_block = response.content[0]
-            if hasattr(first_block, 'text'):
-                config = first_block.text.strip()
-            else:
-                raise ValueError(f"Unexpected content type: {type(first_block)}")
-
             # Извлечь YAML
             config = self._extract_code_block(config, "yaml")
 
@@ -628,14 +1020,6 @@ class ClaudeClient:
                 logger.error(f"Критическая ошибка fallback генератора: {fallback_error}", exc_info=True)
                 raise RuntimeError(f"Не удалось сгенерировать CI/CD конфигурацию: {fallback_error}")
 
-    def _format_components_list(self) -> str:
-        """Форматирует список компонентов для LLM"""
-        lines = []
-        for comp_type, config in TELECOM_COMPONENTS.items():
-            desc = config.get("description", "")
-            lines.append(f"- {comp_type}: {desc}")
-        return "\n".join(lines)
-
     def _generate_fallback_documentation(
         self,
         component_type: str,
@@ -8,8 +8,11 @@ import asyncio
 import os
 import sys
 import logging
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
 
 # Исправление кодировки Windows (должно быть ПЕРЕД логированием!)
 try:
@@ -35,19 +38,16 @@ except ImportError:
 
 from dotenv import load_dotenv
 import yaml
+from jsonschema import Draft202012Validator, ValidationError
 
 # Загрузка переменных окружения
 load_dotenv()
 
 # Импорт внутренних модулей
 try:
-    from .llm.claude_client import ClaudeClient
     from .tools.telecom_generator import TelecomGenerator
     from .tools.k8s_generator import K8sManifestGenerator
     from .tools.cicd_generator import CICDGenerator
-    from .tools.troubleshooter import TroubleshooterTool
-    from .tools.cost_optimizer import CostOptimizer
-    from .tools.security_analyzer import SecurityAnalyzer
     from .utils.validation import SecurityValidator, validate_api_key, sanitize_secret_value
     from .config import OutputConfig, UIConfig
 except ImportError as e:
@@ -55,6 +55,282 @@ except ImportError as e:
     logger.info("Убедитесь, что все файлы созданы корректно")
     sys.exit(1)
 
+# LLM-модули (и вместе с ними anthropic) импортируются лениво
+# в MTSDeployServer._init_llm_tools - только при наличии API ключа
+if TYPE_CHECKING:
+    from .llm.claude_client import ClaudeClient
+    from .tools.troubleshooter import TroubleshooterTool
+    from .tools.cost_optimizer import CostOptimizer
+    from .tools.security_analyzer import SecurityAnalyzer
+
+
+# libyaml (C) парсер если PyYAML собран с ним - в разы быстрее чистого Python
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@lru_cache(maxsize=4)
+def _validate_env_file_cached(env_path: str, version: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+    """Проверка .env; version (mtime, размер) нужен только как часть ключа кэша"""
+    return SecurityValidator.validate_env_file(env_path)
+
+
+def _validate_env_file(env_path: str = ".env") -> Dict[str, Any]:
+    """
+    SecurityValidator.validate_env_file с кэшем по (путь, mtime, размер)
+
+    Повторное создание сервера в том же процессе (тесты, несколько
+    экземпляров) не перечитывает и не разбирает неизменившийся .env.
+    Результат общий для всех вызовов - только для чтения
+    """
+    try:
+        stat = os.stat(env_path)
+        version: Optional[Tuple[int, int]] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = None
+    return _validate_env_file_cached(os.path.abspath(env_path), version)
+
+
+# Статические ответы tools - общие для всех вызовов
+_NO_API_KEY_MESSAGE = (
+    "❌ Ошибка: ANTHROPIC_API_KEY не установлен!\n\n"
+    "Для использования LLM генерации:\n"
+    "1. Создайте файл .env\n"
+    "2. Добавьте: ANTHROPIC_API_KEY=your-key\n"
+    "3. Перезапустите сервер\n\n"
+    "Используйте generate_k8s_manifest для генерации без LLM."
+)
+_TROUBLESHOOTER_UNAVAILABLE = "❌ Auto-troubleshooter недоступен (требуется ANTHROPIC_API_KEY)"
+
+# Значения output_dir по умолчанию - для них путь разрешается один раз при старте
+_DEFAULT_OUTPUT_DIRS = frozenset({"./output", "output"})
+
+# O_BINARY есть только на Windows - без него os.write подменяет \n на \r\n
+_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
+
+def _write_file(path: Path, content: str) -> None:
+    """
+    Запись текстового файла (блокирующая, вызывается в потоке)
+
+    Кодирует содержимое один раз и пишет через os.write, минуя слои
+    TextIOWrapper/BufferedWriter, которые создаёт Path.write_text
+    """
+    data = memoryview(content.encode(OutputConfig.FILE_ENCODING))
+    fd = os.open(path, _WRITE_FLAGS, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def _build_tool_defs() -> Tuple[types.Tool, ...]:
+    """Описания MCP tools (имя, описание, JSON schema аргументов)"""
+    return (
+        types.Tool(
+            name="generate_telecom_manifest",
+            description=(
+                "Генерирует Kubernetes манифесты для телеком-компонентов "
+                "(5G UPF, AMF, SMF, биллинг, RabbitMQ и др.). "
+                "Использует LLM для интеллектуальной генерации."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "prompt": {
+                        "type": "string",
+                        "description": (
+                            "Описание что нужно задеплоить. "
+                            "Например: 'Deploy 5G UPF for Moscow region with 10Gbps throughput'"
+                        )
+                    },
+                    "output_dir": {
+                        "type": "string",
+                        "description": "Директория для сохранения манифестов (по умолчанию: ./output)",
+                        "default": "./output"
+                    }
+                },
+                "required": ["prompt"]
+            }
+        ),
+
+        types.Tool(
+            name="generate_k8s_manifest",
+            description=(
+                "Генерирует стандартные Kubernetes манифесты "
+                "(Deployment, Service, Ingress, ConfigMap и др.) "
+                "для обычных приложений (не телеком-специфичных)."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "service_name": {
+                        "type": "string",
+                        "description": "Имя сервиса"
+                    },
+                    "image": {
+                        "type": "string",
+                        "description": "Docker образ (например: nginx:latest)"
+                    },
+                    "replicas": {
+                        "type": "integer",
+                        "description": "Количество реплик (по умолчанию: 3)",
+                        "default": 3
+                    },
+                    "port": {
+                        "type": "integer",
+                        "description": "Порт приложения (по умолчанию: 8080)",
+                        "default": 8080
+                    }
+                },
+                "required": ["service_name", "image"]
+            }
+        ),
+
+        types.Tool(
+            name="generate_cicd_pipeline",
+            description=(
+                "Генерирует CI/CD pipeline конфигурацию "
+                "(GitLab CI, GitHub Actions). "
+                "Включает сборку, тесты, security scan и деплой."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "platform": {
+                        "type": "string",
+                        "enum": ["gitlab", "github"],
+                        "description": "CI/CD платформа (gitlab или github)"
+                    },
+                    "project_type": {
+                        "type": "string",
+                        "enum": ["python", "nodejs", "golang", "java", "telecom"],
+                        "description": "Тип проекта"
+                    },
+                    "include_security_scan": {
+                        "type": "boolean",
+                        "description": "Включить security scanning (Trivy)",
+                        "default": True
+                    }
+                },
+                "required": ["platform", "project_type"]
+            }
+        ),
+
+        types.Tool(
+            name="generate_documentation",
+            description=(
+                "Генерирует документацию и runbook для деплоя. "
+                "Включает: описание, prerequisites, deployment steps, "
+                "troubleshooting, rollback procedure."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "component_type": {
+                        "type": "string",
+                        "description": "Тип компонента (5g_upf, billing, etc.)"
+                    },
+                    "manifests": {
+                        "type": "object",
+                        "description": "Сгенерированные манифесты (JSON)"
+                    }
+                },
+                "required": ["component_type"]
+            }
+        ),
+
+        types.Tool(
+            name="troubleshoot_deployment",
+            description=(
+                "🔍 Auto-troubleshooting для Kubernetes deployments. "
+                "LLM автоматически диагностирует проблемы с deployment, "
+                "анализирует логи, события и предлагает решение."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "namespace": {
+                        "type": "string",
+                        "description": "Kubernetes namespace"
+                    },
+                    "deployment_name": {
+                        "type": "string",
+                        "description": "Имя deployment для диагностики"
+                    }
+                },
+                "required": ["namespace", "deployment_name"]
+            }
+        ),
+
+        types.Tool(
+            name="apply_auto_fix",
+            description=(
+                "🔧 Применяет автоматическое исправление для deployment проблемы. "
+                "Выполняет kubectl команду для исправления (с опцией dry-run)."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "fix_command": {
+                        "type": "string",
+                        "description": "kubectl команда для исправления"
+                    },
+                    "dry_run": {
+                        "type": "boolean",
+                        "description": "Режим dry-run (только проверка, без реального применения)",
+                        "default": True
+                    }
+                },
+                "required": ["fix_command"]
+            }
+        ),
+
+        types.Tool(
+            name="analyze_cost",
+            description=(
+                "💰 Анализирует стоимость K8s манифестов и предлагает оптимизации. "
+                "Рассчитывает текущую и оптимизированную стоимость deployment, "
+                "показывает потенциальную экономию в рублях."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "manifests": {
+                        "type": "object",
+                        "description": "Словарь манифестов (filename: yaml_content)"
+                    },
+                    "cluster_type": {
+                        "type": "string",
+                        "enum": ["production", "staging", "development"],
+                        "description": "Тип кластера для оптимизации",
+                        "default": "production"
+                    }
+                },
+                "required": ["manifests"]
+            }
+        ),
+
+        types.Tool(
+            name="analyze_security",
+            description=(
+                "🔒 Анализирует безопасность K8s манифестов. "
+                "Проверяет security contexts, secrets management, network policies, "
+                "RBAC, и соответствие Pod Security Standards. Генерирует security score."
+            ),
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "manifests": {
+                        "type": "object",
+                        "description": "Словарь манифестов (filename: yaml_content)"
+                    }
+                },
+                "required": ["manifests"]
+            }
+        ),
+    )
+
 
 class MTSDeployServer:
     """
@@ -62,16 +338,51 @@ class MTSDeployServer:
     Предоставляет tools для генерации K8s манифестов и CI/CD конфигов
     """
 
+    __slots__ = (
+        "server",
+        "symbols",
+        "api_key",
+        "claude_client",
+        "telecom_generator",
+        "k8s_generator",
+        "cicd_generator",
+        "troubleshooter",
+        "cost_optimizer",
+        "security_analyzer",
+        "_sym_ok",
+        "_sym_err",
+        "_sym_warn",
+        "_sym_search",
+        "_project_root",
+        "_default_output",
+        "_tool_defs",
+        "_handlers",
+        "_validators",
+    )
+
     def __init__(self):
         self.server = Server("mts-deploy-ai")
         self.symbols = UIConfig.get_symbols()
 
+        # Часто используемые символы - атрибутами, без поиска по словарю
+        self._sym_ok = self.symbols['success']
+        self._sym_err = self.symbols['error']
+        self._sym_warn = self.symbols['warning']
+        self._sym_search = self.symbols['search']
+
+        # Корень проекта для проверки output директорий (фиксируется при старте)
+        self._project_root = Path.cwd().resolve()
+        default_output = (self._project_root / "output").resolve()
+        self._default_output: Optional[Path] = (
+            default_output if default_output.is_relative_to(self._project_root) else None
+        )
+
         # Валидация .env файла
-        logger.info(f"{self.symbols['search']} Проверка конфигурации...")
-        env_validation = SecurityValidator.validate_env_file()
+        logger.info(f"{self._sym_search} Проверка конфигурации...")
+        env_validation = _validate_env_file()
 
         if not env_validation['valid']:
-            logger.error(f"{self.symbols['error']} Ошибки в .env файле:")
+            logger.error(f"{self._sym_err} Ошибки в .env файле:")
             for error in env_validation['errors']:
                 logger.error(f"   {error}")
             for warning in env_validation['warnings']:
@@ -82,33 +393,26 @@ class MTSDeployServer:
         if validate_api_key(self.api_key):
             # sanitize_secret_value требует non-None строку
             sanitized = sanitize_secret_value(self.api_key) if self.api_key else "N/A"
-            logger.info(f"{self.symbols['success']} API ключ валиден: {sanitized}")
+            logger.info(f"{self._sym_ok} API ключ валиден: {sanitized}")
         else:
-            logger.warning(f"{self.symbols['warning']} ANTHROPIC_API_KEY не установлен или невалиден!")
+            logger.warning(f"{self._sym_warn} ANTHROPIC_API_KEY не установлен или невалиден!")
             logger.warning("   Скопируйте .env.example в .env и добавьте ваш API ключ")
             logger.warning("   Получить ключ: https://console.anthropic.com/")
             self.api_key = None
 
         # Инициализация компонентов
         try:
-            self.claude_client: Optional[ClaudeClient] = ClaudeClient(api_key=self.api_key) if self.api_key else None
+            self.claude_client: Optional["ClaudeClient"] = None
             self.telecom_generator = TelecomGenerator()
             self.k8s_generator = K8sManifestGenerator()
             self.cicd_generator = CICDGenerator()
-            self.troubleshooter: Optional[TroubleshooterTool] = None
-            self.cost_optimizer: Optional[CostOptimizer] = None
-            self.security_analyzer: Optional[SecurityAnalyzer] = None
+            self.troubleshooter: Optional["TroubleshooterTool"] = None
+            self.cost_optimizer: Optional["CostOptimizer"] = None
+            self.security_analyzer: Optional["SecurityAnalyzer"] = None
 
             # Инициализация LLM-based tools только если есть API ключ
-            if self.api_key and self.claude_client:
-                from anthropic import AsyncAnthropic
-                claude_async = AsyncAnthropic(api_key=self.api_key)
-                self.troubleshooter = TroubleshooterTool(claude_async)
-                self.cost_optimizer = CostOptimizer(claude_async)
-                self.security_analyzer = SecurityAnalyzer(claude_async)
-                logger.info("✅ Auto-troubleshooter инициализирован")
-                logger.info("✅ Cost Optimizer инициализирован")
-                logger.info("✅ Security Analyzer инициализирован")
+            if self.api_key:
+                self._init_llm_tools()
 
             logger.info("✅ Все компоненты инициализированы")
         except Exception as e:
@@ -118,216 +422,57 @@ class MTSDeployServer:
         # Регистрация tools
         self._register_tools()
 
+    def _init_llm_tools(self) -> None:
+        """
+        Инициализация LLM-based компонентов
+
+        Модули импортируются здесь, а не на уровне модуля: anthropic тянет
+        за собой pydantic и http клиент (порядка секунды на холодном старте),
+        а без API ключа они не нужны
+        """
+        from .llm.claude_client import ClaudeClient
+        from .tools.troubleshooter import TroubleshooterTool
+        from .tools.cost_optimizer import CostOptimizer
+        from .tools.security_analyzer import SecurityAnalyzer
+
+        self.claude_client = ClaudeClient(api_key=self.api_key)
+
+        # Tools используют тот же AsyncAnthropic, что и ClaudeClient:
+        # общий пул соединений (keep-alive, лимиты) и настройки повторов
+        claude_async = self.claude_client.client
+        self.troubleshooter = TroubleshooterTool(claude_async)
+        self.cost_optimizer = CostOptimizer(claude_async)
+        self.security_analyzer = SecurityAnalyzer(claude_async)
+        logger.info("✅ LLM tools инициализированы: Auto-troubleshooter, Cost Optimizer, Security Analyzer")
+
     def _register_tools(self):
         """Регистрация MCP tools"""
 
+        # Описания tools не меняются за время жизни процесса - строим один раз
+        self._tool_defs = _build_tool_defs()
+
+        # Таблица маршрутизации: имя tool -> обработчик (неизменяемая)
+        self._handlers: Mapping[str, Callable[[Dict[str, Any]], Awaitable[str]]] = MappingProxyType({
+            "generate_telecom_manifest": self._handle_telecom_manifest,
+            "generate_k8s_manifest": self._handle_k8s_manifest,
+            "generate_cicd_pipeline": self._handle_cicd_pipeline,
+            "generate_documentation": self._handle_documentation,
+            "troubleshoot_deployment": self._handle_troubleshoot,
+            "apply_auto_fix": self._handle_apply_fix,
+            "analyze_cost": self._handle_cost_analysis,
+            "analyze_security": self._handle_security_analysis,
+        })
+
+        # Валидаторы inputSchema компилируются один раз, а не на каждый вызов
+        self._validators: Dict[str, Draft202012Validator] = {
+            tool.name: Draft202012Validator(tool.inputSchema)
+            for tool in self._tool_defs
+        }
+
         @self.server.list_tools()
         async def list_tools() -> List[types.Tool]:
             """Список доступных tools"""
-            return [
-                types.Tool(
-                    name="generate_telecom_manifest",
-                    description=(
-                        "Генерирует Kubernetes манифесты для телеком-компонентов "
-                        "(5G UPF, AMF, SMF, биллинг, RabbitMQ и др.). "
-                        "Использует LLM для интеллектуальной генерации."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "prompt": {
-                                "type": "string",
-                                "description": (
-                                    "Описание что нужно задеплоить. "
-                                    "Например: 'Deploy 5G UPF for Moscow region with 10Gbps throughput'"
-                                )
-                            },
-                            "output_dir": {
-                                "type": "string",
-                                "description": "Директория для сохранения манифестов (по умолчанию: ./output)",
-                                "default": "./output"
-                            }
-                        },
-                        "required": ["prompt"]
-                    }
-                ),
-
-                types.Tool(
-                    name="generate_k8s_manifest",
-                    description=(
-                        "Генерирует стандартные Kubernetes манифесты "
-                        "(Deployment, Service, Ingress, ConfigMap и др.) "
-                        "для обычных приложений (не телеком-специфичных)."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "service_name": {
-                                "type": "string",
-                                "description": "Имя сервиса"
-                            },
-                            "image": {
-                                "type": "string",
-                                "description": "Docker образ (например: nginx:latest)"
-                            },
-                            "replicas": {
-                                "type": "integer",
-                                "description": "Количество реплик (по умолчанию: 3)",
-                                "default": 3
-                            },
-                            "port": {
-                                "type": "integer",
-                                "description": "Порт приложения (по умолчанию: 8080)",
-                                "default": 8080
-                            }
-                        },
-                        "required": ["service_name", "image"]
-                    }
-                ),
-
-                types.Tool(
-                    name="generate_cicd_pipeline",
-                    description=(
-                        "Генерирует CI/CD pipeline конфигурацию "
-                        "(GitLab CI, GitHub Actions). "
-                        "Включает сборку, тесты, security scan и деплой."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "platform": {
-                                "type": "string",
-                                "enum": ["gitlab", "github"],
-                                "description": "CI/CD платформа (gitlab или github)"
-                            },
-                            "project_type": {
-                                "type": "string",
-                                "enum": ["python", "nodejs", "golang", "java", "telecom"],
-                                "description": "Тип проекта"
-                            },
-                            "include_security_scan": {
-                                "type": "boolean",
-                                "description": "Включить security scanning (Trivy)",
-                                "default": True
-                            }
-                        },
-                        "required": ["platform", "project_type"]
-                    }
-                ),
-
-                types.Tool(
-                    name="generate_documentation",
-                    description=(
-                        "Генерирует документацию и runbook для деплоя. "
-                        "Включает: описание, prerequisites, deployment steps, "
-                        "troubleshooting, rollback procedure."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "component_type": {
-                                "type": "string",
-                                "description": "Тип компонента (5g_upf, billing, etc.)"
-                            },
-                            "manifests": {
-                                "type": "object",
-                                "description": "Сгенерированные манифесты (JSON)"
-                            }
-                        },
-                        "required": ["component_type"]
-                    }
-                ),
-
-                types.Tool(
-                    name="troubleshoot_deployment",
-                    description=(
-                        "🔍 Auto-troubleshooting для Kubernetes deployments. "
-                        "LLM автоматически диагностирует проблемы с deployment, "
-                        "анализирует логи, события и предлагает решение."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "namespace": {
-                                "type": "string",
-                                "description": "Kubernetes namespace"
-                            },
-                            "deployment_name": {
-                                "type": "string",
-                                "description": "Имя deployment для диагностики"
-                            }
-                        },
-                        "required": ["namespace", "deployment_name"]
-                    }
-                ),
-
-                types.Tool(
-                    name="apply_auto_fix",
-                    description=(
-                        "🔧 Применяет автоматическое исправление для deployment проблемы. "
-                        "Выполняет kubectl команду для исправления (с опцией dry-run)."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "fix_command": {
-                                "type": "string",
-                                "description": "kubectl команда для исправления"
-                            },
-                            "dry_run": {
-                                "type": "boolean",
-                                "description": "Режим dry-run (только проверка, без реального применения)",
-                                "default": True
-                            }
-                        },
-                        "required": ["fix_command"]
-                    }
-                ),
-
-                types.Tool(
-                    name="analyze_cost",
-                    description=(
-                        "💰 Анализирует стоимость K8s манифестов и предлагает оптимизации. "
-                        "Рассчитывает текущую и оптимизированную стоимость deployment, "
-                        "показывает потенциальную экономию в рублях."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "manifests": {
-                                "type": "object",
-                                "description": "Словарь манифестов (filename: yaml_content)"
-                            },
-                            "cluster_type": {
-                                "type": "string",
-                                "enum": ["production", "staging", "development"],
-                                "description": "Тип кластера для оптимизации",
-                                "default": "production"
-                            }
-                        },
-                        "required": ["manifests"]
-                    }
-                ),
-
-                types.Tool(
-                    name="analyze_security",
-                    description=(
-                        "🔒 Анализирует безопасность K8s манифестов. "
-                        "Проверяет security contexts, secrets management, network policies, "
-                        "RBAC, и соответствие Pod Security Standards. Генерирует security score."
-                    ),
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "manifests": {
-                                "type": "object",
-                                "description": "Словарь манифестов (filename: yaml_content)"
-                            }
-                        },
-                        "required": ["manifests"]
-                    }
-                ),
-            ]
+            return list(self._tool_defs)
 
         @self.server.call_tool()
         async def call_tool(
@@ -337,57 +482,44 @@ class MTSDeployServer:
             """Обработка вызова tool"""
 
             try:
-                logger.info(f"🔧 Вызов tool: {name}")
-                logger.info(f"   Аргументы: {arguments}")
+                logger.info("🔧 Вызов tool: %s", name)
+                logger.debug("   Аргументы: %r", arguments)
+
+                # Проверка аргументов по inputSchema tool
+                validator = self._validators.get(name)
+                if validator is not None:
+                    try:
+                        validator.validate(arguments)
+                    except ValidationError as e:
+                        raise ValueError(f"Invalid arguments for {name}: {e.message}") from None
 
                 # Проверка доступности LLM
                 if name == "generate_telecom_manifest" and not self.claude_client:
-                    return [types.TextContent(
-                        type="text",
-                        text="❌ Ошибка: ANTHROPIC_API_KEY не установлен!\n\n"
-                             "Для использования LLM генерации:\n"
-                             "1. Создайте файл .env\n"
-                             "2. Добавьте: ANTHROPIC_API_KEY=your-key\n"
-                             "3. Перезапустите сервер\n\n"
-                             "Используйте generate_k8s_manifest для генерации без LLM."
-                    )]
+                    return [types.TextContent(type="text", text=_NO_API_KEY_MESSAGE)]
 
                 # Маршрутизация на соответствующий обработчик
-                if name == "generate_telecom_manifest":
-                    result = await self._handle_telecom_manifest(arguments)
-                elif name == "generate_k8s_manifest":
-                    result = await self._handle_k8s_manifest(arguments)
-                elif name == "generate_cicd_pipeline":
-                    result = await self._handle_cicd_pipeline(arguments)
-                elif name == "generate_documentation":
-                    result = await self._handle_documentation(arguments)
-                elif name == "troubleshoot_deployment":
-                    result = await self._handle_troubleshoot(arguments)
-                elif name == "apply_auto_fix":
-                    result = await self._handle_apply_fix(arguments)
-                elif name == "analyze_cost":
-                    result = await self._handle_cost_analysis(arguments)
-                elif name == "analyze_security":
-                    result = await self._handle_security_analysis(arguments)
-                else:
+                handler = self._handlers.get(name)
+                if handler is None:
                     result = f"❌ Неизвестный tool: {name}"
+                else:
+                    result = await handler(arguments)
 
                 return [types.TextContent(type="text", text=result)]
 
             except ValueError as e:
-                logger.error(f"❌ Ошибка валидации при выполнении tool {name}: {e}")
+                logger.error("❌ Ошибка валидации при выполнении tool %s: %s", name, e)
                 return [types.TextContent(
                     type="text",
                     text=f"❌ Ошибка валидации: {str(e)}\n\nПроверьте входные параметры."
                 )]
             except RuntimeError as e:
-                logger.error(f"❌ Runtime ошибка при выполнении tool {name}: {e}")
+                logger.error("❌ Runtime ошибка при выполнении tool %s: %s", name, e)
                 return [types.TextContent(
                     type="text",
                     text=f"❌ Runtime ошибка: {str(e)}\n\nПопробуйте повторить запрос или проверьте конфигурацию."
                 )]
             except Exception as e:
-                logger.error(f"❌ Критическая ошибка при выполнении tool {name}: {e}", exc_info=True)
+                logger.error("❌ Критическая ошибка при выполнении tool %s: %s", name, e, exc_info=True)
                 return [types.TextContent(
                     type="text",
                     text=f"❌ Критическая ошибка: {str(e)}\n\nПодробности в логах.\n\nТип ошибки: {type(e).__name__}"
@@ -403,74 +535,117 @@ class MTSDeployServer:
 
     def _validate_output_dir(self, output_dir: str) -> Path:
         """Валидация output директории (защита от path traversal)"""
+        # Частый случай - директория по умолчанию, уже проверенная при старте
+        if output_dir in _DEFAULT_OUTPUT_DIRS and self._default_output is not None:
+            return self._default_output
+
         output_path = Path(output_dir).resolve()
-        project_root = Path.cwd().resolve()
 
-        # Проверка что путь не выходит за пределы проекта
-        if not str(output_path).startswith(str(project_root)):
+        # Проверка что путь не выходит за пределы проекта (по компонентам пути,
+        # а не строковым префиксом: /proj-evil не должен проходить для /proj)
+        if not output_path.is_relative_to(self._project_root):
             raise ValueError(f"Output directory must be within project: {output_dir}")
 
         return output_path
 
+    def _save_manifest(self, filename: str, content: str, output_path: Path) -> Optional[str]:
+        """
+        Валидирует и сохраняет манифест (блокирующий, вызывается в потоке)
+
+        Returns:
+            Путь к сохранённому файлу или None если YAML невалиден
+        """
+        # Валидация YAML перед сохранением
+        if OutputConfig.VALIDATE_YAML and filename.endswith('.yaml'):
+            try:
+                # Проверяем что это валидный YAML: достаточно прогнать парсер
+                # до конца, без построения объектов (safe_load_all ленивый -
+                # без итерации он ничего не проверял)
+                deque(yaml.parse(content, Loader=_YAML_LOADER), maxlen=0)
+                logger.debug("%s YAML валидация пройдена: %s", self._sym_ok, filename)
+            except yaml.YAMLError as e:
+                logger.error("%s Невалидный YAML в %s: %s", self._sym_err, filename, e)
+                logger.warning("   Пропускаем сохранение %s", filename)
+                return None
+
+        file_path = output_path / filename
+        _write_file(file_path, content)
+        logger.info("%s Сохранен: %s", self._sym_ok, file_path)
+        return str(file_path)
+
+    def _write_files(self, output_path: Path, files: Dict[str, str]) -> List[str]:
+        """
+        Записывает набор файлов в директорию (блокирующий, вызывается в потоке)
+
+        Returns:
+            Пути к сохранённым файлам
+        """
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        saved_files = []
+        for filename, content in files.items():
+            file_path = output_path / filename
+            _write_file(file_path, content)
+            saved_files.append(str(file_path))
+        return saved_files
+
     async def _handle_telecom_manifest(self, args: Dict[str, Any]) -> str:
         """Обработка генерации телеком-манифестов с LLM"""
         # Валидация входных данных
         prompt = self._validate_prompt(args.get("prompt", ""))
         output_path = self._validate_output_dir(args.get("output_dir", "./output"))
 
-        logger.info(f"📡 Генерация телеком-манифеста: {prompt[:100]}...")
+        logger.info("📡 Генерация телеком-манифеста: %s...", prompt[:100])
 
         # Проверка наличия Claude client
         if not self.claude_client:
             raise RuntimeError("Claude client is not initialized (missing API key)")
 
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        # Каждый манифест валидируется и пишется на диск сразу как готов
+        # (в потоке, чтобы не блокировать event loop), пока остальные
+        # ещё оптимизируются через LLM
+        saved: Dict[str, Optional[str]] = {}
+
+        async def save(filename: str, content: str) -> None:
+            saved[filename] = await asyncio.to_thread(
+                self._save_manifest, filename, content, output_path
+            )
+
         # Используем LLM для полной генерации
         result = await self.claude_client.generate_telecom_deployment(
             prompt=prompt,
-            output_dir=str(output_path)
+            output_dir=str(output_path),
+            on_manifest=save
         )
 
-        # Сохраняем манифесты
-        output_path.mkdir(parents=True, exist_ok=True)
-
-        saved_files = []
-        for filename, content in result["manifests"].items():
-            # Валидация YAML перед сохранением
-            if OutputConfig.VALIDATE_YAML and filename.endswith('.yaml'):
-                try:
-                    # Проверяем что это валидный YAML
-                    yaml.safe_load_all(content)
-                    logger.debug(f"{self.symbols['success']} YAML валидация пройдена: {filename}")
-                except yaml.YAMLError as e:
-                    logger.error(f"{self.symbols['error']} Невалидный YAML в {filename}: {e}")
-                    logger.warning(f"   Пропускаем сохранение {filename}")
-                    continue
-
-            file_path = output_path / filename
-            file_path.write_text(content, encoding=OutputConfig.FILE_ENCODING)
-            saved_files.append(str(file_path))
-            logger.info(f"{self.symbols['success']} Сохранен: {file_path}")
+        saved_files = [saved[filename] for filename in result["manifests"] if saved.get(filename)]
 
         # Сохраняем документацию
         if "documentation" in result:
             docs_path = output_path / "RUNBOOK.md"
-            docs_path.write_text(result["documentation"], encoding='utf-8')
+            await asyncio.to_thread(_write_file, docs_path, result["documentation"])
             saved_files.append(str(docs_path))
-            logger.info(f"📄 Документация: {docs_path}")
+            logger.info("📄 Документация: %s", docs_path)
 
         # Формируем ответ
-        response = f"✅ Телеком-манифесты успешно сгенерированы!\n\n"
-        response += f"📊 Анализ:\n{result.get('analysis', 'N/A')}\n\n"
-        response += f"📁 Сохранено файлов: {len(saved_files)}\n"
+        parts: List[str] = [
+            f"✅ Телеком-манифесты успешно сгенерированы!\n\n",
+            f"📊 Анализ:\n{result.get('analysis', 'N/A')}\n\n",
+            f"📁 Сохранено файлов: {len(saved_files)}\n"
+        ]
         for file in saved_files:
-            response += f"   • {file}\n"
+            parts.append(f"   • {file}\n")
 
-        response += f"\n💡 Что дальше:\n"
-        response += f"1. Проверьте манифесты: ls {output_path}\n"
-        response += f"2. Валидация: kubectl apply --dry-run=client -f {output_path}/\n"
-        response += f"3. Деплой: kubectl apply -f {output_path}/\n"
+        parts.extend((
+            f"\n💡 Что дальше:\n",
+            f"1. Проверьте манифесты: ls {output_path}\n",
+            f"2. Валидация: kubectl apply --dry-run=client -f {output_path}/\n",
+            f"3. Деплой: kubectl apply -f {output_path}/\n"
+        ))
 
-        return response
+        return "".join(parts)
 
     async def _handle_k8s_manifest(self, args: Dict[str, Any]) -> str:
         """Обработка генерации стандартных K8s манифестов (без LLM)"""
@@ -479,7 +654,7 @@ class MTSDeployServer:
         replicas = args.get("replicas", 3)
         port = args.get("port", 8080)
 
-        logger.info(f"🔧 Генерация K8s манифеста: {service_name}")
+        logger.info("🔧 Генерация K8s манифеста: %s", service_name)
 
         # Генерация через шаблоны
         manifests = self.k8s_generator.generate_basic_deployment(
@@ -489,26 +664,21 @@ class MTSDeployServer:
             port=port
         )
 
-        # Сохранение
-        output_dir = Path("./output")
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        saved_files = []
-        for filename, content in manifests.items():
-            file_path = output_dir / filename
-            file_path.write_text(content, encoding='utf-8')
-            saved_files.append(str(file_path))
-
-        response = f"✅ K8s манифесты сгенерированы!\n\n"
-        response += f"📋 Сервис: {service_name}\n"
-        response += f"🐳 Образ: {image}\n"
-        response += f"🔢 Реплики: {replicas}\n"
-        response += f"🔌 Порт: {port}\n\n"
-        response += f"📁 Файлы:\n"
+        # Сохранение - одним заходом в поток на все файлы
+        saved_files = await asyncio.to_thread(self._write_files, Path("./output"), manifests)
+
+        parts: List[str] = [
+            f"✅ K8s манифесты сгенерированы!\n\n",
+            f"📋 Сервис: {service_name}\n",
+            f"🐳 Образ: {image}\n",
+            f"🔢 Реплики: {replicas}\n",
+            f"🔌 Порт: {port}\n\n",
+            f"📁 Файлы:\n"
+        ]
         for file in saved_files:
-            response += f"   • {file}\n"
+            parts.append(f"   • {file}\n")
 
-        return response
+        return "".join(parts)
 
     async def _handle_cicd_pipeline(self, args: Dict[str, Any]) -> str:
         """Обработка генерации CI/CD пайплайна"""
@@ -516,7 +686,7 @@ class MTSDeployServer:
         project_type = args["project_type"]
         include_security = args.get("include_security_scan", True)
 
-        logger.info(f"🔄 Генерация CI/CD: {platform} для {project_type}")
+        logger.info("🔄 Генерация CI/CD: %s для %s", platform, project_type)
 
         # Генерация через CICDGenerator
         if self.claude_client:
@@ -540,20 +710,22 @@ class MTSDeployServer:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         output_path.write_text(config, encoding='utf-8')
 
-        response = f"✅ CI/CD pipeline сгенерирован!\n\n"
-        response += f"🏗️  Платформа: {platform}\n"
-        response += f"📦 Тип проекта: {project_type}\n"
-        response += f"🔒 Security scan: {'включен' if include_security else 'отключен'}\n\n"
-        response += f"📁 Файл: {output_path}\n"
+        parts: List[str] = [
+            f"✅ CI/CD pipeline сгенерирован!\n\n",
+            f"🏗️  Платформа: {platform}\n",
+            f"📦 Тип проекта: {project_type}\n",
+            f"🔒 Security scan: {'включен' if include_security else 'отключен'}\n\n",
+            f"📁 Файл: {output_path}\n"
+        ]
 
-        return response
+        return "".join(parts)
 
     async def _handle_documentation(self, args: Dict[str, Any]) -> str:
         """Обработка генерации документации"""
         component_type = args["component_type"]
         manifests = args.get("manifests", {})
 
-        logger.info(f"📝 Генерация документации для: {component_type}")
+        logger.info("📝 Генерация документации для: %s", component_type)
 
         if not self.claude_client:
             return "❌ Для генерации документации требуется ANTHROPIC_API_KEY"
@@ -569,21 +741,23 @@ class MTSDeployServer:
         docs_path.parent.mkdir(parents=True, exist_ok=True)
         docs_path.write_text(docs, encoding='utf-8')
 
-        response = f"✅ Документация сгенерирована!\n\n"
-        response += f"📄 Компонент: {component_type}\n"
-        response += f"📁 Файл: {docs_path}\n"
+        parts: List[str] = [
+            f"✅ Документация сгенерирована!\n\n",
+            f"📄 Компонент: {component_type}\n",
+            f"📁 Файл: {docs_path}\n"
+        ]
 
-        return response
+        return "".join(parts)
 
     async def _handle_troubleshoot(self, args: Dict[str, Any]) -> str:
         """Обработка auto-troubleshooting deployment"""
         namespace = args["namespace"]
         deployment_name = args["deployment_name"]
 
-        logger.info(f"🔍 Диагностика deployment: {namespace}/{deployment_name}")
+        logger.info("🔍 Диагностика deployment: %s/%s", namespace, deployment_name)
 
         if not self.troubleshooter:
-            return "❌ Auto-troubleshooter недоступен (требуется ANTHROPIC_API_KEY)"
+            return _TROUBLESHOOTER_UNAVAILABLE
 
         # Запуск диагностики
         diagnosis = await self.troubleshooter.diagnose_deployment(
@@ -595,33 +769,43 @@ class MTSDeployServer:
             return f"❌ Ошибка диагностики: {diagnosis['error']}"
 
         # Формирование отчета
-        response = f"🔍 **Диагностика deployment: {namespace}/{deployment_name}**\n\n"
-        response += f"**Проблема:** {diagnosis['problem']}\n\n"
-        response += f"**Корневая причина:** {diagnosis['root_cause']}\n\n"
-        response += f"**Критичность:** {diagnosis['severity']}\n\n"
+        fix_command = diagnosis['fix_command']
+
+        parts: List[str] = [
+            f"🔍 **Диагностика deployment: {namespace}/{deployment_name}**\n\n",
+            f"**Проблема:** {diagnosis['problem']}\n\n",
+            f"**Корневая причина:** {diagnosis['root_cause']}\n\n",
+            f"**Критичность:** {diagnosis['severity']}\n\n"
+        ]
 
-        if diagnosis['fix_command']:
-            response += f"**Предложенное решение:**\n```bash\n{diagnosis['fix_command']}\n```\n\n"
-            response += f"**Объяснение:** {diagnosis.get('fix_explanation', 'N/A')}\n\n"
+        if fix_command:
+            parts.extend((
+                f"**Предложенное решение:**\n```bash\n{fix_command}\n```\n\n",
+                f"**Объяснение:** {diagnosis.get('fix_explanation', 'N/A')}\n\n"
+            ))
 
             if diagnosis['auto_fixable']:
-                response += "✅ **Безопасно применить автоматически**\n"
-                response += f"Для применения используйте: apply_auto_fix с командой выше\n"
+                parts.extend((
+                    "✅ **Безопасно применить автоматически**\n",
+                    f"Для применения используйте: apply_auto_fix с командой выше\n"
+                ))
             else:
-                response += "⚠️ **Требуется ручное подтверждение**\n"
-                response += "Проверьте команду перед применением\n"
+                parts.extend((
+                    "⚠️ **Требуется ручное подтверждение**\n",
+                    "Проверьте команду перед применением\n"
+                ))
 
-        return response
+        return "".join(parts)
 
     async def _handle_apply_fix(self, args: Dict[str, Any]) -> str:
         """Обработка применения автоматического исправления"""
         fix_command = args["fix_command"]
         dry_run = args.get("dry_run", True)
 
-        logger.info(f"🔧 Применение fix: {fix_command} (dry_run={dry_run})")
+        logger.info("🔧 Применение fix: %s (dry_run=%s)", fix_command, dry_run)
 
         if not self.troubleshooter:
-            return "❌ Auto-troubleshooter недоступен (требуется ANTHROPIC_API_KEY)"
+            return _TROUBLESHOOTER_UNAVAILABLE
 
         # Применение исправления
         result = await self.troubleshooter.apply_fix(
@@ -631,14 +815,16 @@ class MTSDeployServer:
 
         if result["status"] == "success":
             mode = "DRY-RUN" if result["dry_run"] else "ПРИМЕНЕНО"
-            response = f"✅ **Fix {mode} успешно!**\n\n"
-            response += f"**Команда:** {fix_command}\n\n"
-            response += f"**Результат:**\n```\n{result['output']}\n```\n"
+            parts: List[str] = [
+                f"✅ **Fix {mode} успешно!**\n\n",
+                f"**Команда:** {fix_command}\n\n",
+                f"**Результат:**\n```\n{result['output']}\n```\n"
+            ]
 
             if result["dry_run"]:
-                response += "\n💡 Для реального применения установите dry_run=false\n"
+                parts.append("\n💡 Для реального применения установите dry_run=false\n")
 
-            return response
+            return "".join(parts)
         else:
             return f"❌ Ошибка применения fix: {result['error']}"
 
@@ -647,7 +833,7 @@ class MTSDeployServer:
         manifests = args["manifests"]
         cluster_type = args.get("cluster_type", "production")
 
-        logger.info(f"💰 Анализ стоимости для {cluster_type} кластера")
+        logger.info("💰 Анализ стоимости для %s кластера", cluster_type)
 
         if not self.cost_optimizer:
             return "❌ Cost Optimizer недоступен (требуется ANTHROPIC_API_KEY)"
@@ -662,28 +848,34 @@ class MTSDeployServer:
             return f"❌ Ошибка анализа стоимости: {analysis['error']}"
 
         # Формирование отчета
-        response = f"💰 **COST OPTIMIZATION ANALYSIS**\n\n"
-        response += f"**Кластер:** {cluster_type}\n\n"
-        response += f"**Текущая стоимость:** {analysis['current_cost_monthly']:,.2f} ₽/мес\n"
-        response += f"**Оптимизированная:** {analysis['optimized_cost_monthly']:,.2f} ₽/мес\n"
-        response += f"**Экономия:** {analysis['savings_monthly']:,.2f} ₽/мес ({analysis['savings_percentage']}%)\n"
-        response += f"**Экономия в год:** {analysis['savings_yearly']:,.2f} ₽/год\n\n"
-
-        if analysis['optimizations']:
-            response += f"**Предложенные оптимизации:**\n"
-            for opt in analysis['optimizations']:
-                response += f"\n• **{opt.get('type')}** для `{opt.get('target')}`\n"
-                response += f"  - Было: {opt.get('from')}\n"
-                response += f"  - Станет: {opt.get('to')}\n"
-                response += f"  - Экономия: {opt.get('savings', 0):,.2f} ₽/мес\n"
-                response += f"  - Причина: {opt.get('reason', 'N/A')}\n"
-
-        if analysis['recommendations']:
-            response += f"\n**Рекомендации:**\n"
-            for rec in analysis['recommendations']:
-                response += f"• {rec}\n"
-
-        return response
+        optimizations = analysis['optimizations']
+        recommendations = analysis['recommendations']
+
+        parts: List[str] = [
+            f"💰 **COST OPTIMIZATION ANALYSIS**\n\n",
+            f"**Кластер:** {cluster_type}\n\n",
+            f"**Текущая стоимость:** {analysis['current_cost_monthly']:,.2f} ₽/мес\n",
+            f"**Оптимизированная:** {analysis['optimized_cost_monthly']:,.2f} ₽/мес\n",
+            f"**Экономия:** {analysis['savings_monthly']:,.2f} ₽/мес ({analysis['savings_percentage']}%)\n",
+            f"**Экономия в год:** {analysis['savings_yearly']:,.2f} ₽/год\n\n"
+        ]
+
+        if optimizations:
+            parts.append(f"**Предложенные оптимизации:**\n")
+            for opt in optimizations:
+                parts.extend((
+                    f"\n• **{opt.get('type')}** для `{opt.get('target')}`\n",
+                    f"  - Было: {opt.get('from')}\n",
+                    f"  - Станет: {opt.get('to')}\n",
+                    f"  - Экономия: {opt.get('savings', 0):,.2f} ₽/мес\n",
+                    f"  - Причина: {opt.get('reason', 'N/A')}\n"
+                ))
+
+        if recommendations:
+            parts.append(f"\n**Рекомендации:**\n")
+            parts.extend(f"• {rec}\n" for rec in recommendations)
+
+        return "".join(parts)
 
     async def _handle_security_analysis(self, args: Dict[str, Any]) -> str:
         """Обработка security анализа"""
@@ -701,65 +893,85 @@ class MTSDeployServer:
             return f"❌ Ошибка security анализа: {analysis['error']}"
 
         # Формирование отчета
-        response = f"🔒 **SECURITY POSTURE ANALYSIS**\n\n"
-        response += f"**Security Score:** {analysis['security_score']}/100 ({analysis['grade']})\n\n"
+        compliance = analysis.get('compliance')
+        critical_issues = analysis['critical_issues']
+        warnings = analysis['warnings']
+        auto_fixes = analysis.get('auto_fixes')
+        recommendations = analysis['recommendations']
+
+        parts: List[str] = [
+            f"🔒 **SECURITY POSTURE ANALYSIS**\n\n",
+            f"**Security Score:** {analysis['security_score']}/100 ({analysis['grade']})\n\n"
+        ]
 
         # Compliance
-        if analysis.get('compliance'):
-            response += f"**Compliance:**\n"
-            for std, status in analysis['compliance'].items():
+        if compliance:
+            parts.append(f"**Compliance:**\n")
+            for std, status in compliance.items():
                 icon = "✅" if status else "❌"
-                response += f"  {icon} {std}\n"
-            response += "\n"
+                parts.append(f"  {icon} {std}\n")
+            parts.append("\n")
 
         # Critical issues
-        if analysis['critical_issues']:
-            response += f"**🔴 Critical Issues ({len(analysis['critical_issues'])}):**\n"
-            for issue in analysis['critical_issues']:
-                response += f"\n• **{issue.get('issue')}**\n"
-                response += f"  - Severity: {issue.get('severity', 'unknown')}\n"
-                response += f"  - Affected: {issue.get('affected', 'N/A')}\n"
-                response += f"  - Mitigation: {issue.get('mitigation', 'N/A')}\n"
+        if critical_issues:
+            parts.append(f"**🔴 Critical Issues ({len(critical_issues)}):**\n")
+            for issue in critical_issues:
+                parts.extend((
+                    f"\n• **{issue.get('issue')}**\n",
+                    f"  - Severity: {issue.get('severity', 'unknown')}\n",
+                    f"  - Affected: {issue.get('affected', 'N/A')}\n",
+                    f"  - Mitigation: {issue.get('mitigation', 'N/A')}\n"
+                ))
 
         # Warnings
-        if analysis['warnings']:
-            response += f"\n**⚠️ Warnings ({len(analysis['warnings'])}):**\n"
-            for warning in analysis['warnings']:
-                response += f"\n• {warning.get('warning', 'N/A')}\n"
-                if warning.get('recommendation'):
-                    response += f"  → {warning['recommendation']}\n"
+        if warnings:
+            parts.append(f"\n**⚠️ Warnings ({len(warnings)}):**\n")
+            for warning in warnings:
+                parts.append(f"\n• {warning.get('warning', 'N/A')}\n")
+                recommendation = warning.get('recommendation')
+                if recommendation:
+                    parts.append(f"  → {recommendation}\n")
 
         # Auto-fixes
-        if analysis.get('auto_fixes'):
-            auto_fixable = [f for f in analysis['auto_fixes'] if f.get('auto_applicable')]
+        if auto_fixes:
+            auto_fixable = [f for f in auto_fixes if f.get('auto_applicable')]
             if auto_fixable:
-                response += f"\n**🔧 Auto-Fixes Available ({len(auto_fixable)}):**\n"
+                parts.append(f"\n**🔧 Auto-Fixes Available ({len(auto_fixable)}):**\n")
                 for fix in auto_fixable:
-                    response += f"\n• {fix.get('issue')}\n"
-                    if fix.get('kubectl_command'):
-                        response += f"  ```bash\n  {fix['kubectl_command']}\n  ```\n"
+                    parts.append(f"\n• {fix.get('issue')}\n")
+                    kubectl_command = fix.get('kubectl_command')
+                    if kubectl_command:
+                        parts.append(f"  ```bash\n  {kubectl_command}\n  ```\n")
 
         # Recommendations
-        if analysis['recommendations']:
-            response += f"\n**💡 Recommendations:**\n"
-            for rec in analysis['recommendations']:
-                response += f"• {rec}\n"
+        if recommendations:
+            parts.append(f"\n**💡 Recommendations:**\n")
+            parts.extend(f"• {rec}\n" for rec in recommendations)
 
-        return response
+        return "".join(parts)
 
     async def run(self):
         """Запуск MCP сервера"""
         logger.info("🚀 Запуск MTS Deploy AI MCP Server...")
-        logger.info(f"📍 Версия: 1.0.0")
-        logger.info(f"🔑 API ключ: {'✅ установлен' if self.api_key else '❌ не установлен'}")
-
-        async with stdio_server() as (read_stream, write_stream):
-            logger.info("✅ MCP Server запущен и готов к работе!")
-            await self.server.run(
-                read_stream,
-                write_stream,
-                initialization_options=None  # type: ignore
-            )
+        logger.info("📍 Версия: 1.0.0")
+        logger.info("🔑 API ключ: %s", "✅ установлен" if self.api_key else "❌ не установлен")
+
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                logger.info("✅ MCP Server запущен и готов к работе!")
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    initialization_options=None  # type: ignore
+                )
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Закрывает общий пул соединений с Claude API"""
+        if self.claude_client:
+            from .llm.claude_client import close_shared_http_client
+            await close_shared_http_client()
 
 
 async def main():
@@ -770,7 +982,7 @@ async def main():
     except KeyboardInterrupt:
         logger.info("\n👋 Остановка сервера...")
     except Exception as e:
-        logger.error(f"❌ Критическая ошибка: {e}", exc_info=True)
+        logger.error("❌ Критическая ошибка: %s", e, exc_info=True)
         sys.exit(1)
 
 
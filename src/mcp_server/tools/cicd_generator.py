@@ -3,12 +3,72 @@
 Поддерживает GitLab CI и GitHub Actions
 """
 
-from typing import Dict
+from types import MappingProxyType
+from typing import Mapping
+
+
+# Docker образы для тестов по типу проекта
+_TEST_IMAGES: Mapping[str, str] = MappingProxyType({
+    "python": "python:3.11",
+    "nodejs": "node:20",
+    "golang": "golang:1.21",
+    "java": "maven:3.9-openjdk-17",
+    "telecom": "python:3.11"
+})
+
+# Команды запуска тестов (GitLab CI script) по типу проекта
+_TEST_COMMANDS: Mapping[str, str] = MappingProxyType({
+    "python": """    - pip install -r requirements.txt
+    - pip install pytest pytest-cov
+    - pytest --cov=. --cov-report=term""",
+    "nodejs": """    - npm ci
+    - npm run test
+    - npm run lint""",
+    "golang": """    - go mod download
+    - go test ./... -v -coverprofile=coverage.out
+    - go vet ./...""",
+    "java": """    - mvn clean verify
+    - mvn test""",
+    "telecom": """    - pip install -r requirements.txt
+    - pip install pytest
+    - pytest tests/"""
+})
+
+# Те же команды с отступами для `run: |` в GitHub Actions
+_TEST_COMMANDS_INDENTED: Mapping[str, str] = MappingProxyType({
+    project_type: "\n".join(
+        f"        {line.strip('- ')}" for line in commands.split("\n") if line.strip()
+    )
+    for project_type, commands in _TEST_COMMANDS.items()
+})
+
+# GitHub Action для установки окружения по типу проекта
+_GITHUB_SETUP_ACTIONS: Mapping[str, str] = MappingProxyType({
+    "python": """uses: actions/setup-python@v5
+      with:
+        python-version: '3.11'""",
+    "nodejs": """uses: actions/setup-node@v4
+      with:
+        node-version: '20'""",
+    "golang": """uses: actions/setup-go@v5
+      with:
+        go-version: '1.21'""",
+    "java": """uses: actions/setup-java@v4
+      with:
+        java-version: '17'
+        distribution: 'temurin'""",
+    "telecom": """uses: actions/setup-python@v5
+      with:
+        python-version: '3.11'"""
+})
 
 
 class CICDGenerator:
     """Генератор CI/CD pipeline конфигураций"""
 
+    # Состояния нет - экземпляр без __dict__
+    __slots__ = ()
+
     def generate_pipeline(
         self,
         platform: str,
@@ -36,7 +96,7 @@ class CICDGenerator:
     def _generate_gitlab_ci(self, project_type: str, include_security: bool) -> str:
         """Генерирует GitLab CI конфигурацию"""
 
-        config = f"""
+        parts = [f"""
 # MTS Deploy AI - GitLab CI/CD Pipeline
 # Автоматически сгенерировано
 
@@ -72,10 +132,10 @@ test:
   script:
     {self._get_test_commands(project_type)}
   coverage: '/TOTAL.*\\s+(\\d+%)/'
-"""
+"""]
 
         if include_security:
-            config += """
+            parts.append("""
 # Security сканирование
 security:trivy:
   stage: security
@@ -90,9 +150,9 @@ security:secrets:
   script:
     - trufflehog filesystem . --only-verified
   allow_failure: true
-"""
+""")
 
-        config += """
+        parts.append("""
 # Деплой в Kubernetes
 deploy:staging:
   stage: deploy
@@ -120,14 +180,14 @@ deploy:production:
   when: manual
   only:
     - main
-"""
+""")
 
-        return config.strip()
+        return "".join(parts).strip()
 
     def _generate_github_actions(self, project_type: str, include_security: bool) -> str:
         """Генерирует GitHub Actions конфигурацию"""
 
-        config = f"""
+        parts = [f"""
 # MTS Deploy AI - GitHub Actions Workflow
 # Автоматически сгенерировано
 
@@ -187,10 +247,10 @@ jobs:
     - name: Run tests
       run: |
 {self._get_test_commands_indented(project_type)}
-"""
+"""]
 
         if include_security:
-            config += """
+            parts.append("""
   security:
     runs-on: ubuntu-latest
     needs: build
@@ -213,9 +273,9 @@ jobs:
       uses: github/codeql-action/upload-sarif@v3
       with:
         sarif_file: 'trivy-results.sarif'
-"""
+""")
 
-        config += """
+        parts.append("""
   deploy:
     runs-on: ubuntu-latest
     needs: [build, test]
@@ -234,65 +294,22 @@ jobs:
       run: |
         kubectl apply -f output/
         kubectl rollout status deployment/${{ secrets.APP_NAME }} -n production
-"""
+""")
 
-        return config.strip()
+        return "".join(parts).strip()
 
     def _get_test_image(self, project_type: str) -> str:
         """Возвращает Docker образ для тестов"""
-        images = {
-            "python": "python:3.11",
-            "nodejs": "node:20",
-            "golang": "golang:1.21",
-            "java": "maven:3.9-openjdk-17",
-            "telecom": "python:3.11"
-        }
-        return images.get(project_type, "python:3.11")
+        return _TEST_IMAGES.get(project_type, _TEST_IMAGES["python"])
 
     def _get_test_commands(self, project_type: str) -> str:
         """Возвращает команды для запуска тестов"""
-        commands = {
-            "python": """    - pip install -r requirements.txt
-    - pip install pytest pytest-cov
-    - pytest --cov=. --cov-report=term""",
-            "nodejs": """    - npm ci
-    - npm run test
-    - npm run lint""",
-            "golang": """    - go mod download
-    - go test ./... -v -coverprofile=coverage.out
-    - go vet ./...""",
-            "java": """    - mvn clean verify
-    - mvn test""",
-            "telecom": """    - pip install -r requirements.txt
-    - pip install pytest
-    - pytest tests/"""
-        }
-        return commands.get(project_type, commands["python"])
+        return _TEST_COMMANDS.get(project_type, _TEST_COMMANDS["python"])
 
     def _get_test_commands_indented(self, project_type: str) -> str:
         """Возвращает команды с отступами для GitHub Actions"""
-        commands = self._get_test_commands(project_type)
-        lines = commands.split("\n")
-        return "\n".join(f"        {line.strip('- ')}" for line in lines if line.strip())
+        return _TEST_COMMANDS_INDENTED.get(project_type, _TEST_COMMANDS_INDENTED["python"])
 
     def _get_github_setup_action(self, project_type: str) -> str:
         """Возвращает GitHub Action для установки окружения"""
-        actions = {
-            "python": """uses: actions/setup-python@v5
-      with:
-        python-version: '3.11'""",
-            "nodejs": """uses: actions/setup-node@v4
-      with:
-        node-version: '20'""",
-            "golang": """uses: actions/setup-go@v5
-      with:
-        go-version: '1.21'""",
-            "java": """uses: actions/setup-java@v4
-      with:
-        java-version: '17'
-        distribution: 'temurin'""",
-            "telecom": """uses: actions/setup-python@v5
-      with:
-        python-version: '3.11'"""
-        }
-        return actions.get(project_type, actions["python"])
+        return _GITHUB_SETUP_ACTIONS.get(project_type, _GITHUB_SETUP_ACTIONS["python"])
@@ -3,21 +3,156 @@ Cost Optimization Engine для K8s манифестов
 Анализирует и оптимизирует стоимость deployment через LLM
 """
 
-import json
+import asyncio
+import copy
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional, cast
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, cast
 from anthropic import AsyncAnthropic
 from anthropic.types import TextBlock
 import yaml
 
 from ..config import LLMConfig
+from ..utils import fast_json
 
 logger = logging.getLogger(__name__)
 
+# libyaml (C) загрузчик/дампер если PyYAML собран с ним - в разы быстрее
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Множители суффиксов memory/storage в GB
+_MEMORY_MULTIPLIERS: Dict[str, float] = {
+    'Ki': 1 / (1024 * 1024),
+    'Mi': 1 / 1024,
+    'Gi': 1,
+    'Ti': 1024
+}
+_MEMORY_SUFFIXES = tuple(_MEMORY_MULTIPLIERS)
+
+# С этого суммарного размера манифестов разбор YAML уходит в поток,
+# чтобы не блокировать event loop (libyaml держит GIL, так что пул
+# из нескольких потоков разбор не ускоряет)
+_PARSE_THREAD_THRESHOLD = 64 * 1024
+
+# Тип изменения из ответа LLM -> ключ в resources.requests
+_RESOURCE_CHANGES: Dict[str, str] = {
+    "reduce_cpu": "cpu",
+    "reduce_memory": "memory"
+}
+
+# Сколько разобранных файлов держать в кэше (LRU по хешу содержимого)
+_PARSE_CACHE_SIZE = 128
+
+
+# Промпт оптимизации: статические части собираются один раз, на каждом
+# вызове подставляются только тип кластера, summary и стоимость
+_OPTIMIZE_PROMPT_HEADER = """Ты эксперт по оптимизации стоимости Kubernetes deployments с глубокими знаниями телеком-инфраструктуры и FinOps best practices.
+
+"""
+
+_OPTIMIZE_PROMPT_RULES = """
+
+ЗАДАЧА: Оптимизировать стоимость с учётом типа кластера И СОХРАНЕНИЕМ КРИТИЧНЫХ ПАРАМЕТРОВ для телекома.
+
+ПРАВИЛА ОПТИМИЗАЦИИ ПО ОКРУЖЕНИЮ:
+
+**Production (критично для бизнеса):**
+- ❌ НЕ снижать надёжность
+- ✅ Minimum 3 replicas для critical services (5G UPF, AMF, SMF, Billing)
+- ✅ Сохранить fast-ssd для latency-sensitive (UPF)
+- ✅ Сохранить CPU/Memory для high-throughput компонентов
+- ✅ Можно: HPA для elastic scaling, rightsizing если overprovisioned на 50%+
+
+**Staging (тестовое окружение):**
+- ✅ Уменьшить replicas до 2 (но НЕ до 1 для HA тестирования)
+- ✅ Снизить CPU/Memory на 30-50%
+- ✅ Можно использовать standard storage вместо fast-ssd
+- ✅ Spot instances для non-critical компонентов (скидка 35%)
+
+**Development:**
+- ✅ Минимальные resources (но достаточные для работы)
+- ✅ 1 replica (HA не требуется)
+- ✅ standard или slow-hdd storage
+- ✅ Spot instances везде где возможно
+
+ТЕЛЕКОМ-СПЕЦИФИКА (ВАЖНО!):
+
+**5G UPF (User Plane):**
+- Production: НЕ трогать CPU/Memory (data plane performance critical)
+- Production: НЕ уменьшать replicas ниже 3 (high availability)
+- Staging/Dev: Можно снизить до 2 cores, 4Gi memory
+
+**5G AMF/SMF (Control Plane):**
+- Production: Min 3 replicas (session management)
+- Staging: 2 replicas OK
+- Dev: 1 replica OK
+
+**Billing:**
+- Production: Min 3 replicas (финансовые данные!)
+- НЕ использовать Spot instances (критичность данных)
+- Сохранить database resources
+
+ВОЗМОЖНЫЕ ОПТИМИЗАЦИИ:
+
+1. **Rightsizing** - уменьшить overprovisioning:
+   - Если utilization <30% → снизить requests на 30-50%
+   - Если utilization >80% → УВЕЛИЧИТЬ (bottleneck!)
+
+2. **Replicas optimization**:
+   - Production critical: 3 (не трогать)
+   - Production non-critical: можно HPA 2-5
+   - Staging: 2
+   - Dev: 1
+
+3. **Storage optimization**:
+   - Production latency-sensitive: fast-ssd (не трогать)
+   - Production logs/backups: standard
+   - Staging/Dev: standard
+
+4. **Spot instances** (только non-critical):
+   - Development: всё на spot
+   - Staging: background jobs на spot
+   - Production: ТОЛЬКО non-critical workloads
+
+5. **HPA (Horizontal Pod Autoscaler)**:
+   - Elastic workloads: CPU-based HPA
+   - Min replicas = требования HA
+   - Max replicas = cost budget
+
+РАСЧЁТ ЭКОНОМИИ:
+- CPU: 1500 руб/core/месяц
+- Memory: 600 руб/GB/месяц
+- Storage fast-ssd: 50 руб/GB/месяц
+- Storage standard: 20 руб/GB/месяц
+- Spot discount: -35%
+
+Ответь ТОЛЬКО в JSON формате:
+{
+    "changes": [
+        {
+            "type": "reduce_cpu|reduce_memory|reduce_replicas|enable_spot|optimize_hpa",
+            "target": "deployment_name",
+            "from": "текущее значение",
+            "to": "новое значение",
+            "savings": <число в руб/месяц>,
+            "reason": "объяснение"
+        }
+    ],
+    "recommendations": [
+        "дополнительные рекомендации"
+    ],
+    "total_estimated_savings": <число>
+}"""
+
 
 class CostOptimizer:
     """Оптимизация стоимости K8s deployments"""
 
+    __slots__ = ("llm", "model", "pricing", "_parse_cache", "_parse_lock")
+
     def __init__(self, claude_client: AsyncAnthropic):
         self.llm = claude_client
         self.model = LLMConfig.MODEL
@@ -30,6 +165,14 @@ class CostOptimizer:
             "spot_discount": 0.65  # 65% от обычной цены для Spot
         }
 
+        # Кэш разбора YAML: хеш содержимого -> документы. Повторный анализ
+        # тех же манифестов не разбирает их заново. Документы из кэша
+        # не изменяются - _apply_optimizations работает с копиями
+        self._parse_cache: "OrderedDict[bytes, List[Any]]" = OrderedDict()
+        # _parse_all вызывается и в event loop, и в asyncio.to_thread -
+        # обращения к OrderedDict (move_to_end, popitem) под блокировкой
+        self._parse_lock = threading.Lock()
+
     async def analyze_costs(
         self,
         manifests: Dict[str, str],
@@ -48,17 +191,39 @@ class CostOptimizer:
         try:
             logger.info(f"Analyzing costs for {cluster_type} cluster")
 
-            # 1. Рассчитать текущую стоимость
-            current_cost = self._calculate_current_cost(manifests)
-
-            # 2. LLM анализ для оптимизации
-            optimization = await self._llm_optimize(manifests, cluster_type, current_cost)
+            # YAML разбирается один раз: расчёт стоимости, summary для LLM
+            # и применение оптимизаций работают с документами
+            if sum(map(len, manifests.values())) > _PARSE_THREAD_THRESHOLD:
+                parsed = await asyncio.to_thread(self._parse_all, manifests)
+            else:
+                parsed = self._parse_all(manifests)
 
-            # 3. Применить оптимизации
-            optimized_manifests = self._apply_optimizations(manifests, optimization)
+            # 1. Рассчитать текущую стоимость
+            current_cost = self._calculate_current_cost(parsed)
+
+            # 2. LLM анализ для оптимизации; изменения применяются только к
+            # Deployment - без них (или при нулевой стоимости) запрос к LLM
+            # ничего не даст
+            has_deployments = any(
+                isinstance(doc, dict) and doc.get("kind") == "Deployment"
+                for docs in parsed.values()
+                for doc in docs
+            )
+            if current_cost > 0 and has_deployments:
+                optimization = await self._llm_optimize(parsed, cluster_type, current_cost)
+            else:
+                logger.info("No Deployments to optimize, skipping LLM analysis")
+                optimization = {
+                    "changes": [],
+                    "recommendations": ["Нет ресурсов для оптимизации"],
+                    "total_estimated_savings": 0
+                }
+
+            # 3. Применить оптимизации (изменённые файлы в parsed подменяются копиями)
+            optimized_manifests = self._apply_optimizations(manifests, parsed, optimization)
 
             # 4. Рассчитать новую стоимость
-            optimized_cost = self._calculate_current_cost(optimized_manifests)
+            optimized_cost = self._calculate_current_cost(parsed)
 
             # 5. Формирование отчёта
             return {
@@ -80,45 +245,81 @@ class CostOptimizer:
                 "error": str(e)
             }
 
-    def _calculate_current_cost(self, manifests: Dict[str, str]) -> float:
-        """Рассчитывает текущую стоимость манифестов"""
-        total_cost = 0.0
+    def _parse_all(self, manifests: Dict[str, str]) -> Dict[str, List[Any]]:
+        """
+        Разбирает YAML манифесты один раз
+
+        Returns:
+            Документы по именам файлов (не .yaml и невалидные файлы пропускаются)
+        """
+        parsed = {}
 
         for filename, content in manifests.items():
             if not filename.endswith('.yaml'):
                 continue
 
+            key = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+            with self._parse_lock:
+                docs = self._parse_cache.get(key)
+                if docs is not None:
+                    self._parse_cache.move_to_end(key)
+            if docs is not None:
+                parsed[filename] = docs
+                continue
+
             try:
-                docs = list(yaml.safe_load_all(content))
+                # list() здесь нужен: документы переиспользуются (стоимость,
+                # summary, оптимизации), а ошибки разбора ловятся сразу
+                docs = list(yaml.load_all(content, Loader=_YAML_LOADER))
+            except Exception as e:
+                logger.warning(f"Failed to parse {filename}: {e}")
+                continue
 
+            parsed[filename] = docs
+            with self._parse_lock:
+                self._parse_cache[key] = docs
+                if len(self._parse_cache) > _PARSE_CACHE_SIZE:
+                    self._parse_cache.popitem(last=False)
+
+        return parsed
+
+    def _calculate_current_cost(self, parsed: Dict[str, List[Any]]) -> float:
+        """Рассчитывает текущую стоимость разобранных манифестов"""
+        total_cost = 0.0
+
+        for filename, docs in parsed.items():
+            try:
                 for doc in docs:
-                    if not doc or doc.get("kind") != "Deployment":
+                    if not doc:
                         continue
 
-                    replicas = doc.get("spec", {}).get("replicas", 1)
-                    containers = doc.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
+                    kind = doc.get("kind")
+
+                    if kind == "Deployment":
+                        replicas = doc.get("spec", {}).get("replicas", 1)
+                        containers = doc.get("spec", {}).get("template", {}).get("spec", {}).get("containers", [])
 
-                    for container in containers:
-                        resources = container.get("resources", {}).get("requests", {})
+                        for container in containers:
+                            resources = container.get("resources", {}).get("requests", {})
 
-                        # CPU cost
-                        cpu = resources.get("cpu", "100m")
-                        cpu_cores = self._parse_cpu(cpu)
-                        total_cost += cpu_cores * self.pricing["cpu_core"] * replicas
+                            # CPU cost
+                            cpu = resources.get("cpu", "100m")
+                            cpu_cores = self._parse_cpu(cpu)
+                            total_cost += cpu_cores * self.pricing["cpu_core"] * replicas
 
-                        # Memory cost
-                        memory = resources.get("memory", "128Mi")
-                        memory_gb = self._parse_memory(memory)
-                        total_cost += memory_gb * self.pricing["memory_gb"] * replicas
+                            # Memory cost
+                            memory = resources.get("memory", "128Mi")
+                            memory_gb = self._parse_memory(memory)
+                            total_cost += memory_gb * self.pricing["memory_gb"] * replicas
 
                     # Storage cost (PVC)
-                    if doc.get("kind") == "PersistentVolumeClaim":
+                    elif kind == "PersistentVolumeClaim":
                         storage = doc.get("spec", {}).get("resources", {}).get("requests", {}).get("storage", "1Gi")
                         storage_gb = self._parse_memory(storage)
                         total_cost += storage_gb * self.pricing["storage_gb"]
 
             except Exception as e:
-                logger.warning(f"Failed to parse {filename} for cost calculation: {e}")
+                logger.warning(f"Failed to calculate cost for {filename}: {e}")
                 continue
 
         return round(total_cost, 2)
@@ -131,129 +332,31 @@ class CostOptimizer:
 
     def _parse_memory(self, mem_str: str) -> float:
         """Парсит memory строку в GB"""
-        multipliers = {
-            'Ki': 1 / (1024 * 1024),
-            'Mi': 1 / 1024,
-            'Gi': 1,
-            'Ti': 1024
-        }
-
-        for suffix, multiplier in multipliers.items():
-            if mem_str.endswith(suffix):
-                return float(mem_str[:-2]) * multiplier
+        # Все суффиксы двухсимвольные - одна проверка endswith по кортежу
+        if mem_str.endswith(_MEMORY_SUFFIXES):
+            return float(mem_str[:-2]) * _MEMORY_MULTIPLIERS[mem_str[-2:]]
 
         # Default to GB if no suffix
         return float(mem_str)
 
     async def _llm_optimize(
         self,
-        manifests: Dict[str, str],
+        parsed: Dict[str, List[Any]],
         cluster_type: str,
         current_cost: float
     ) -> Dict[str, Any]:
         """LLM анализирует и предлагает оптимизации"""
 
         # Извлечь ключевую информацию из манифестов
-        summary = self._summarize_manifests(manifests)
-
-        prompt = f"""Ты эксперт по оптимизации стоимости Kubernetes deployments с глубокими знаниями телеком-инфраструктуры и FinOps best practices.
-
-ТЕКУЩИЕ МАНИФЕСТЫ ({cluster_type} environment):
-{json.dumps(summary, indent=2, ensure_ascii=False)}
-
-ТЕКУЩАЯ СТОИМОСТЬ: {current_cost} руб/месяц
-
-ЗАДАЧА: Оптимизировать стоимость с учётом типа кластера И СОХРАНЕНИЕМ КРИТИЧНЫХ ПАРАМЕТРОВ для телекома.
-
-ПРАВИЛА ОПТИМИЗАЦИИ ПО ОКРУЖЕНИЮ:
-
-**Production (критично для бизнеса):**
-- ❌ НЕ снижать надёжность
-- ✅ Minimum 3 replicas для critical services (5G UPF, AMF, SMF, Billing)
-- ✅ Сохранить fast-ssd для latency-sensitive (UPF)
-- ✅ Сохранить CPU/Memory для high-throughput компонентов
-- ✅ Можно: HPA для elastic scaling, rightsizing если overprovisioned на 50%+
-
-**Staging (тестовое окружение):**
-- ✅ Уменьшить replicas до 2 (но НЕ до 1 для HA тестирования)
-- ✅ Снизить CPU/Memory на 30-50%
-- ✅ Можно использовать standard storage вместо fast-ssd
-- ✅ Spot instances для non-critical компонентов (скидка 35%)
-
-**Development:**
-- ✅ Минимальные resources (но достаточные для работы)
-- ✅ 1 replica (HA не требуется)
-- ✅ standard или slow-hdd storage
-- ✅ Spot instances везде где возможно
-
-ТЕЛЕКОМ-СПЕЦИФИКА (ВАЖНО!):
-
-**5G UPF (User Plane):**
-- Production: НЕ трогать CPU/Memory (data plane performance critical)
-- Production: НЕ уменьшать replicas ниже 3 (high availability)
-- Staging/Dev: Можно снизить до 2 cores, 4Gi memory
-
-**5G AMF/SMF (Control Plane):**
-- Production: Min 3 replicas (session management)
-- Staging: 2 replicas OK
-- Dev: 1 replica OK
-
-**Billing:**
-- Production: Min 3 replicas (финансовые данные!)
-- НЕ использовать Spot instances (критичность данных)
-- Сохранить database resources
-
-ВОЗМОЖНЫЕ ОПТИМИЗАЦИИ:
-
-1. **Rightsizing** - уменьшить overprovisioning:
-   - Если utilization <30% → снизить requests на 30-50%
-   - Если utilization >80% → УВЕЛИЧИТЬ (bottleneck!)
+        summary = self._summarize_manifests(parsed)
 
-2. **Replicas optimization**:
-   - Production critical: 3 (не трогать)
-   - Production non-critical: можно HPA 2-5
-   - Staging: 2
-   - Dev: 1
-
-3. **Storage optimization**:
-   - Production latency-sensitive: fast-ssd (не трогать)
-   - Production logs/backups: standard
-   - Staging/Dev: standard
-
-4. **Spot instances** (только non-critical):
-   - Development: всё на spot
-   - Staging: background jobs на spot
-   - Production: ТОЛЬКО non-critical workloads
-
-5. **HPA (Horizontal Pod Autoscaler)**:
-   - Elastic workloads: CPU-based HPA
-   - Min replicas = требования HA
-   - Max replicas = cost budget
-
-РАСЧЁТ ЭКОНОМИИ:
-- CPU: 1500 руб/core/месяц
-- Memory: 600 руб/GB/месяц
-- Storage fast-ssd: 50 руб/GB/месяц
-- Storage standard: 20 руб/GB/месяц
-- Spot discount: -35%
-
-Ответь ТОЛЬКО в JSON формате:
-{{
-    "changes": [
-        {{
-            "type": "reduce_cpu|reduce_memory|reduce_replicas|enable_spot|optimize_hpa",
-            "target": "deployment_name",
-            "from": "текущее значение",
-            "to": "новое значение",
-            "savings": <число в руб/месяц>,
-            "reason": "объяснение"
-        }}
-    ],
-    "recommendations": [
-        "дополнительные рекомендации"
-    ],
-    "total_estimated_savings": <число>
-}}"""
+        prompt = "".join((
+            _OPTIMIZE_PROMPT_HEADER,
+            f"ТЕКУЩИЕ МАНИФЕСТЫ ({cluster_type} environment):\n",
+            fast_json.dumps_pretty(summary),
+            f"\n\nТЕКУЩАЯ СТОИМОСТЬ: {current_cost} руб/месяц",
+            _OPTIMIZE_PROMPT_RULES
+        ))
 
         try:
             response = await self.llm.messages.create(
@@ -266,13 +369,7 @@ class CostOptimizer:
             # Извлечение текста из ответа
             content = cast(TextBlock, response.content[0]).text
 
-            # Извлечь JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-
-            result = json.loads(content)
+            result = fast_json.loads(self._extract_json(content))
             logger.info(f"LLM proposed {len(result.get('changes', []))} optimizations")
 
             return result
@@ -285,17 +382,27 @@ class CostOptimizer:
                 "total_estimated_savings": 0
             }
 
-    def _summarize_manifests(self, manifests: Dict[str, str]) -> List[Dict]:
+    def _extract_json(self, content: str) -> str:
+        """Извлекает JSON из markdown блока (```json или просто ```)"""
+        start = content.find("```json")
+        if start != -1:
+            start += len("```json")
+        else:
+            start = content.find("```")
+            if start == -1:
+                return content
+            start += len("```")
+
+        # Незакрытый блок - берём до конца текста
+        end = content.find("```", start)
+        return content[start:end if end != -1 else None].strip()
+
+    def _summarize_manifests(self, parsed: Dict[str, List[Any]]) -> List[Dict]:
         """Создаёт краткое описание манифестов для LLM"""
         summary = []
 
-        for filename, content in manifests.items():
-            if not filename.endswith('.yaml'):
-                continue
-
+        for filename, docs in parsed.items():
             try:
-                docs = list(yaml.safe_load_all(content))
-
                 for doc in docs:
                     if not doc:
                         continue
@@ -326,53 +433,73 @@ class CostOptimizer:
     def _apply_optimizations(
         self,
         manifests: Dict[str, str],
+        parsed: Dict[str, List[Any]],
         optimization: Dict[str, Any]
     ) -> Dict[str, str]:
-        """Применяет оптимизации к манифестам"""
+        """
+        Применяет оптимизации к манифестам
+
+        Документы из кэша разбора не изменяются: перед первым изменением
+        файла его документы копируются и подменяются в parsed. В YAML заново
+        сериализуются только изменённые файлы, остальные возвращаются как были
+        """
 
-        optimized = manifests.copy()
         changes = optimization.get("changes", [])
+        modified_files = set()
+        copied_files = set()
+
+        # Индекс Deployment по имени (файл, позиция документа): каждое
+        # изменение - один поиск в dict вместо перебора всех документов
+        deployments: Dict[str, List[Tuple[str, int]]] = {}
+        for filename, docs in parsed.items():
+            for position, doc in enumerate(docs):
+                if not isinstance(doc, dict) or doc.get("kind") != "Deployment":
+                    continue
+                name = (doc.get("metadata") or {}).get("name")
+                deployments.setdefault(name, []).append((filename, position))
 
         for change in changes:
             change_type = change.get("type")
-            target = change.get("target")
             new_value = change.get("to")
 
-            for filename, content in optimized.items():
-                if not filename.endswith('.yaml'):
-                    continue
+            for filename, position in deployments.get(change.get("target"), ()):
+                if filename not in copied_files:
+                    parsed[filename] = copy.deepcopy(parsed[filename])
+                    copied_files.add(filename)
+                doc = parsed[filename][position]
 
                 try:
-                    docs = list(yaml.safe_load_all(content))
-                    modified = False
-
-                    for doc in docs:
-                        if not doc or doc.get("metadata", {}).get("name") != target:
-                            continue
-
-                        # Применить изменение
-                        if change_type == "reduce_replicas" and doc.get("kind") == "Deployment":
-                            doc["spec"]["replicas"] = int(new_value)
-                            modified = True
-
-                        elif change_type == "reduce_cpu" and doc.get("kind") == "Deployment":
-                            containers = doc["spec"]["template"]["spec"]["containers"]
-                            for container in containers:
-                                container.setdefault("resources", {}).setdefault("requests", {})["cpu"] = new_value
-                            modified = True
-
-                        elif change_type == "reduce_memory" and doc.get("kind") == "Deployment":
-                            containers = doc["spec"]["template"]["spec"]["containers"]
-                            for container in containers:
-                                container.setdefault("resources", {}).setdefault("requests", {})["memory"] = new_value
-                            modified = True
-
-                    if modified:
-                        # Сохранить обратно в YAML
-                        optimized[filename] = yaml.dump_all(docs, default_flow_style=False)
+                    # Применить изменение
+                    if change_type == "reduce_replicas":
+                        doc["spec"]["replicas"] = int(new_value)
+                        modified_files.add(filename)
+
+                    elif change_type in _RESOURCE_CHANGES:
+                        resource = _RESOURCE_CHANGES[change_type]
+                        containers = doc["spec"]["template"]["spec"]["containers"]
+                        for container in containers:
+                            # resources.requests почти всегда уже есть -
+                            # создаём только когда отсутствуют
+                            resources = container.get("resources")
+                            if resources is None:
+                                container["resources"] = resources = {}
+                            requests = resources.get("requests")
+                            if requests is None:
+                                resources["requests"] = requests = {}
+                            requests[resource] = new_value
+                        modified_files.add(filename)
 
                 except Exception as e:
                     logger.warning(f"Failed to apply optimization to {filename}: {e}")
                     continue
 
-        return optimized
+        if not modified_files:
+            return manifests.copy()
+
+        # Изменённые файлы - обратно в YAML, остальные как были (с исходным
+        # форматированием и комментариями)
+        return {
+            filename: yaml.dump_all(parsed[filename], Dumper=_YAML_DUMPER, default_flow_style=False)
+            if filename in modified_files else content
+            for filename, content in manifests.items()
+        }
@@ -6,34 +6,11 @@
 from typing import Dict
 
 
-class K8sManifestGenerator:
-    """Генератор базовых K8s манифестов"""
-
-    def generate_basic_deployment(
-        self,
-        service_name: str,
-        image: str,
-        replicas: int = 3,
-        port: int = 8080,
-        namespace: str = "default"
-    ) -> Dict[str, str]:
-        """
-        Генерирует базовый Deployment + Service + ConfigMap
+# Шаблоны манифестов, значения подставляются через str.format_map;
+# .strip() на каждом вызове больше не нужен
 
-        Args:
-            service_name: Имя сервиса
-            image: Docker образ
-            replicas: Количество реплик
-            port: Порт приложения
-            namespace: Namespace K8s
-
-        Returns:
-            Dict с манифестами
-        """
-        manifests = {}
-
-        # Deployment
-        manifests["deployment.yaml"] = f"""
+# Deployment
+_DEPLOYMENT_TEMPLATE = """\
 apiVersion: apps/v1
 kind: Deployment
 metadata:
@@ -75,11 +52,10 @@ spec:
             path: /ready
             port: {port}
           initialDelaySeconds: 5
-          periodSeconds: 5
-""".strip()
+          periodSeconds: 5"""
 
-        # Service
-        manifests["service.yaml"] = f"""
+# Service
+_SERVICE_TEMPLATE = """\
 apiVersion: v1
 kind: Service
 metadata:
@@ -92,11 +68,10 @@ spec:
   - port: 80
     targetPort: {port}
     protocol: TCP
-  type: ClusterIP
-""".strip()
+  type: ClusterIP"""
 
-        # ConfigMap
-        manifests["configmap.yaml"] = f"""
+# ConfigMap
+_CONFIGMAP_TEMPLATE = """\
 apiVersion: v1
 kind: ConfigMap
 metadata:
@@ -105,7 +80,52 @@ metadata:
 data:
   app.conf: |
     PORT={port}
-    LOG_LEVEL=INFO
-""".strip()
+    LOG_LEVEL=INFO"""
+
+
+class K8sManifestGenerator:
+    """Генератор базовых K8s манифестов"""
+
+    # Состояния нет - экземпляр без __dict__
+    __slots__ = ()
+
+    def generate_basic_deployment(
+        self,
+        service_name: str,
+        image: str,
+        replicas: int = 3,
+        port: int = 8080,
+        namespace: str = "default"
+    ) -> Dict[str, str]:
+        """
+        Генерирует базовый Deployment + Service + ConfigMap
+
+        Args:
+            service_name: Имя сервиса
+            image: Docker образ
+            replicas: Количество реплик
+            port: Порт приложения
+            namespace: Namespace K8s
+
+        Returns:
+            Dict с манифестами
+        """
+        values = {
+            "service_name": service_name,
+            "image": image,
+            "replicas": replicas,
+            "port": port,
+            "namespace": namespace
+        }
+        manifests = {}
+
+        # Deployment
+        manifests["deployment.yaml"] = _DEPLOYMENT_TEMPLATE.format_map(values)
+
+        # Service
+        manifests["service.yaml"] = _SERVICE_TEMPLATE.format_map(values)
+
+        # ConfigMap
+        manifests["configmap.yaml"] = _CONFIGMAP_TEMPLATE.format_map(values)
 
         return manifests
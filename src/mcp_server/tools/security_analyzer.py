@@ -3,192 +3,85 @@ Security Posture Analysis для K8s манифестов
 Анализирует безопасность deployment и предлагает улучшения
 """
 
-import json
+import asyncio
+import hashlib
 import logging
-from typing import Dict, Any, List, Optional, cast
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, Any, List, Mapping, Optional, Tuple, cast
 from anthropic import AsyncAnthropic
 from anthropic.types import TextBlock
 import yaml
 
 from ..config import LLMConfig
+from ..llm.batch import run_batch
+from ..llm.cache import LLMCache, MemoryBackend
+from ..utils import fast_json
 
 logger = logging.getLogger(__name__)
 
-
-class SecurityAnalyzer:
-    """Анализ безопасности K8s манифестов"""
-
-    def __init__(self, claude_client: AsyncAnthropic):
-        self.llm = claude_client
-        self.model = LLMConfig.MODEL
-
-    async def analyze_security(
-        self,
-        manifests: Dict[str, str]
-    ) -> Dict[str, Any]:
-        """
-        Анализирует security posture манифестов
-
-        Args:
-            manifests: Словарь YAML манифестов
-
-        Returns:
-            Dict с security score и рекомендациями
-        """
-        try:
-            logger.info("Starting security analysis")
-
-            # 1. Базовые security checks
-            basic_checks = self._run_basic_checks(manifests)
-
-            # 2. LLM глубокий анализ
-            llm_analysis = await self._llm_security_analysis(manifests, basic_checks)
-
-            # 3. Генерация security fixes
-            fixes = await self._generate_security_fixes(llm_analysis)
-
-            # 4. Расчёт security score
-            score = self._calculate_security_score(basic_checks, llm_analysis)
-
-            return {
-                "status": "analyzed",
-                "security_score": score,
-                "grade": self._get_security_grade(score),
-                "basic_checks": basic_checks,
-                "critical_issues": llm_analysis.get("critical_issues", []),
-                "warnings": llm_analysis.get("warnings", []),
-                "recommendations": llm_analysis.get("recommendations", []),
-                "auto_fixes": fixes,
-                "compliance": self._check_compliance(basic_checks)
-            }
-
-        except Exception as e:
-            logger.error(f"Security analysis failed: {e}")
-            return {
-                "status": "error",
-                "error": str(e),
-                "security_score": 0
-            }
-
-    def _run_basic_checks(self, manifests: Dict[str, str]) -> Dict[str, Any]:
-        """Базовые security проверки"""
-        checks = {
-            "security_context_present": False,
-            "run_as_non_root": False,
-            "privileged_containers": [],
-            "host_network_usage": [],
-            "host_path_volumes": [],
-            "secrets_in_env": [],
-            "capabilities_added": [],
-            "resource_limits_set": False,
-            "readiness_probes_set": False,
-            "liveness_probes_set": False,
-            "network_policies_present": False,
-            "service_account_set": False,
-            "image_pull_policy": [],
-            "trusted_registry": []
-        }
-
-        for filename, content in manifests.items():
-            if not filename.endswith('.yaml'):
-                continue
-
-            try:
-                docs = list(yaml.safe_load_all(content))
-
-                for doc in docs:
-                    if not doc:
-                        continue
-
-                    kind = doc.get("kind")
-                    name = doc.get("metadata", {}).get("name", "unnamed")
-
-                    if kind == "Deployment":
-                        spec = doc.get("spec", {}).get("template", {}).get("spec", {})
-
-                        # Security context
-                        pod_security = spec.get("securityContext", {})
-                        if pod_security:
-                            checks["security_context_present"] = True
-                            if pod_security.get("runAsNonRoot"):
-                                checks["run_as_non_root"] = True
-
-                        # Containers
-                        for container in spec.get("containers", []):
-                            container_name = container.get("name", "unnamed")
-
-                            # Privileged
-                            if container.get("securityContext", {}).get("privileged"):
-                                checks["privileged_containers"].append(f"{name}/{container_name}")
-
-                            # Capabilities
-                            caps = container.get("securityContext", {}).get("capabilities", {}).get("add", [])
-                            if caps:
-                                checks["capabilities_added"].extend([f"{name}/{container_name}: {cap}" for cap in caps])
-
-                            # Resource limits
-                            if container.get("resources", {}).get("limits"):
-                                checks["resource_limits_set"] = True
-
-                            # Probes
-                            if container.get("readinessProbe"):
-                                checks["readiness_probes_set"] = True
-                            if container.get("livenessProbe"):
-                                checks["liveness_probes_set"] = True
-
-                            # Image registry
-                            image = container.get("image", "")
-                            if image:
-                                if "registry.mts.ru" in image or "docker.io/library" in image:
-                                    checks["trusted_registry"].append(image)
-                                else:
-                                    checks["image_pull_policy"].append(f"{name}: {image}")
-
-                            # Secrets in env
-                            for env in container.get("env", []):
-                                if "SECRET" in env.get("name", "").upper() or "PASSWORD" in env.get("name", "").upper():
-                                    if "value" in env:  # Hardcoded secret
-                                        checks["secrets_in_env"].append(f"{name}/{container_name}: {env['name']}")
-
-                        # Host network
-                        if spec.get("hostNetwork"):
-                            checks["host_network_usage"].append(name)
-
-                        # Host path volumes
-                        for volume in spec.get("volumes", []):
-                            if volume.get("hostPath"):
-                                checks["host_path_volumes"].append(f"{name}: {volume['hostPath']['path']}")
-
-                        # Service account
-                        if spec.get("serviceAccountName"):
-                            checks["service_account_set"] = True
-
-                    elif kind == "NetworkPolicy":
-                        checks["network_policies_present"] = True
-
-            except Exception as e:
-                logger.warning(f"Failed to check {filename}: {e}")
-                continue
-
-        return checks
-
-    async def _llm_security_analysis(
-        self,
-        manifests: Dict[str, str],
-        basic_checks: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """LLM глубокий security анализ"""
-
-        # Подготовить summary для LLM
-        manifest_summary = self._summarize_for_security(manifests)
-
-        prompt = f"""Ты эксперт по Kubernetes security и телеком-инфраструктуре с глубокими знаниями 5G компонентов и их специфичных security требований.
-
-МАНИФЕСТЫ:
-{json.dumps(manifest_summary, indent=2, ensure_ascii=False)}
-
-БАЗОВЫЕ ПРОВЕРКИ:
-{json.dumps(basic_checks, indent=2, ensure_ascii=False)}
+# libyaml (C) загрузчик если PyYAML собран с ним - в разы быстрее
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Общие пустые значения по умолчанию для .get() в проверках: литералы {} и []
+# создавали бы новый объект на каждом обращении
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+_NOTHING: tuple = ()
+
+# Имена env переменных, похожие на секреты (те же ключевые слова, что в
+# промпте LLM). SECRET и PASSWORD - в любом месте имени (PGPASSWORD,
+# CLIENTSECRET); TOKEN и KEY - только последним сегментом через "_",
+# чтобы KEYCLOAK_URL, SSL_KEY_PATH, TOKEN_TTL_SECONDS не считались секретами
+_SECRET_ENV_RE = re.compile(
+    r"SECRET|PASSWORD|(?:^|_)(?:API)?(?:TOKEN|KEY)$",
+    re.IGNORECASE
+)
+
+# Доверенные registry - только как префикс образа, чтобы
+# "evil.io/registry.mts.ru/x" не считался доверенным
+_TRUSTED_REGISTRY_PREFIXES = ("registry.mts.ru/", "docker.io/library/")
+
+# Тип исправления по тексту issue. Альтернативы - lookahead от начала
+# строки, поэтому побеждает первая по порядку (как в цепочке if/elif),
+# а не та, что раньше встретилась в тексте; имя группы = тип исправления
+_FIX_TYPE_RE = re.compile(
+    r"^(?:"
+    r"(?=.*?(?:security context|runasnonroot))(?P<add_security_context>)"
+    r"|(?=.*?privileged)(?P<remove_privileged>)"
+    r"|(?=.*?(?:secret|password))(?P<move_to_secret>)"
+    r"|(?=.*?network policy)(?P<add_network_policy>)"
+    r"|(?=.*?resource limit)(?P<add_resource_limits>)"
+    r")",
+    re.IGNORECASE | re.DOTALL
+)
+
+_AUTO_FIXABLE_TYPES = frozenset({
+    "add_security_context",
+    "add_resource_limits",
+    "add_network_policy"
+})
+
+# JSON объект в markdown блоке кода (```json ... ``` или просто ``` ... ```)
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*(\{.*?\})\s*```", re.DOTALL)
+
+# С этого суммарного размера манифестов разбор YAML уходит в поток,
+# чтобы не блокировать event loop (libyaml держит GIL, так что пул
+# из нескольких потоков разбор не ускоряет)
+_PARSE_THREAD_THRESHOLD = 64 * 1024
+
+# Сколько разобранных файлов держать в кэше (LRU по хешу содержимого)
+_PARSE_CACHE_SIZE = 128
+
+
+# Статическая часть промпта security анализа - в system с cache_control:
+# не собирается заново на каждом вызове и кэшируется на стороне API
+# (prompt caching), меняются только манифесты и базовые проверки
+_SECURITY_SYSTEM_PROMPT = """Ты эксперт по Kubernetes security и телеком-инфраструктуре с глубокими знаниями 5G компонентов и их специфичных security требований.
+
+В сообщении пользователя - МАНИФЕСТЫ (summary) и результаты БАЗОВЫХ ПРОВЕРОК.
 
 ГЛУБОКИЙ SECURITY АНАЛИЗ:
 
@@ -289,21 +182,21 @@ class SecurityAnalyzer:
     - Mitigation strategies
 
 Ответь ТОЛЬКО в JSON:
-{{
+{
     "critical_issues": [
-        {{
+        {
             "issue": "описание проблемы",
             "severity": "critical|high|medium|low",
             "affected": "компонент",
             "cve_risk": "высокий|средний|низкий",
             "mitigation": "как исправить"
-        }}
+        }
     ],
     "warnings": [
-        {{
+        {
             "warning": "описание предупреждения",
             "recommendation": "рекомендация"
-        }}
+        }
     ],
     "recommendations": [
         "общие рекомендации по улучшению security"
@@ -311,50 +204,435 @@ class SecurityAnalyzer:
     "compliance_issues": [
         "проблемы с compliance (PCI-DSS, ISO 27001)"
     ]
-}}"""
+}"""
 
+_SECURITY_SYSTEM = [
+    {"type": "text", "text": _SECURITY_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}
+]
+
+
+@dataclass(slots=True)
+class _ContainerView:
+    """
+    Поля первого контейнера pod'а, которые попадают в summary для LLM
+
+    Проверки в _check_deployment обходят все контейнеры и читают dict
+    напрямую - там создание объекта на каждый контейнер дороже самих проверок
+    """
+    security_context: Mapping[str, Any]
+    image: str
+    has_limits: bool
+
+    @classmethod
+    def from_raw(cls, container: Dict[str, Any]) -> "_ContainerView":
+        # "or": в YAML поле может быть явно пустым (securityContext: null)
+        return cls(
+            container.get("securityContext") or _EMPTY,
+            container.get("image", ""),
+            bool((container.get("resources") or _EMPTY).get("limits"))
+        )
+
+
+class SecurityAnalyzer:
+    """Анализ безопасности K8s манифестов"""
+
+    def __init__(self, claude_client: AsyncAnthropic):
+        self.llm = claude_client
+        self.model = LLMConfig.MODEL
+
+        # Кэш ответов LLM по промпту (summary + базовые проверки): повторный
+        # анализ неизменённых манифестов не ходит в API
+        self.cache = LLMCache(MemoryBackend(max_entries=LLMConfig.RESPONSE_CACHE_SIZE))
+
+        # Кэш разбора YAML: хеш содержимого -> документы. Повторный анализ
+        # тех же манифестов не разбирает их заново
+        self._parse_cache: "OrderedDict[bytes, List[Any]]" = OrderedDict()
+        # _parse_all вызывается и в event loop, и в asyncio.to_thread -
+        # обращения к OrderedDict (move_to_end, popitem) под блокировкой
+        self._parse_lock = threading.Lock()
+
+    async def analyze_security(
+        self,
+        manifests: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """
+        Анализирует security posture манифестов
+
+        Args:
+            manifests: Словарь YAML манифестов
+
+        Returns:
+            Dict с security score и рекомендациями
+        """
         try:
-            response = await self.llm.messages.create(
-                model=self.model,
-                max_tokens=2500,
-                temperature=0.1,  # Очень консервативно для security
-                messages=[{"role": "user", "content": prompt}]
-            )
+            logger.info("Starting security analysis")
 
-            # Извлечение текста из ответа
-            content = cast(TextBlock, response.content[0]).text
+            # YAML разбирается один раз: базовые проверки и summary для LLM
+            # работают с документами
+            parsed = await self._parse(manifests)
 
-            # Извлечь JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
+            # 1. Базовые security checks
+            basic_checks = self._run_basic_checks(parsed)
 
-            result = json.loads(content)
-            logger.info(f"LLM found {len(result.get('critical_issues', []))} critical issues")
+            # 2. LLM глубокий анализ
+            llm_analysis = await self._llm_security_analysis(parsed, basic_checks)
 
-            return result
+            return await self._build_report(basic_checks, llm_analysis)
 
         except Exception as e:
-            logger.error(f"LLM security analysis failed: {e}")
-            return {
-                "critical_issues": [],
-                "warnings": [{"warning": f"LLM анализ не удался: {str(e)}"}],
-                "recommendations": [],
-                "compliance_issues": []
-            }
+            logger.error(f"Security analysis failed: {e}")
+            return self._error_report(e)
 
-    def _summarize_for_security(self, manifests: Dict[str, str]) -> List[Dict]:
-        """Создаёт summary для security анализа"""
-        summary = []
+    async def analyze_security_batch(
+        self,
+        manifests_list: List[Dict[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Анализирует несколько наборов манифестов через Message Batches API
+
+        LLM запросы всех наборов (кроме найденных в кэше) отправляются одним
+        batch'ем (в 2 раза дешевле, но ответ может прийти только через
+        несколько часов)
+
+        Args:
+            manifests_list: Наборы YAML манифестов
+
+        Returns:
+            Список результатов в порядке manifests_list, формат как у
+            analyze_security
+        """
+        logger.info(f"Starting batch security analysis of {len(manifests_list)} bundles")
+
+        # (базовые проверки, ключ кэша, ответ из кэша) по индексу набора
+        bundles: List[Tuple[Dict[str, Any], str, Optional[str]]] = []
+        requests = []
+
+        for index, manifests in enumerate(manifests_list):
+            parsed = await self._parse(manifests)
+            basic_checks = self._run_basic_checks(parsed)
+            request = self._security_request(parsed, basic_checks)
+            cache_key = self._request_cache_key(request)
+            cached = await self.cache.get(cache_key)
+
+            bundles.append((basic_checks, cache_key, cached))
+            if cached is None:
+                # custom_id: только [a-zA-Z0-9_-]
+                requests.append({"custom_id": f"bundle-{index}", "params": request})
+
+        try:
+            texts = await run_batch(self.llm, requests)
+            batch_error = None
+        except Exception as e:
+            logger.error(f"Security batch failed: {e}")
+            texts, batch_error = {}, e
+
+        reports = []
+        for index, (basic_checks, cache_key, cached) in enumerate(bundles):
+            try:
+                if cached is not None:
+                    llm_analysis = fast_json.loads(cached)
+                else:
+                    text = texts.get(f"bundle-{index}")
+                    if text is None:
+                        raise RuntimeError(batch_error or "нет ответа в batch")
+                    llm_analysis = await self._parse_llm_response(text, cache_key)
+            except Exception as e:
+                logger.error(f"LLM security analysis failed for bundle {index}: {e}")
+                llm_analysis = self._llm_fallback(e)
+
+            try:
+                reports.append(await self._build_report(basic_checks, llm_analysis))
+            except Exception as e:
+                logger.error(f"Security analysis failed for bundle {index}: {e}")
+                reports.append(self._error_report(e))
+
+        return reports
+
+    async def _build_report(
+        self,
+        basic_checks: Dict[str, Any],
+        llm_analysis: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Формирует итоговый отчёт по базовым проверкам и анализу LLM"""
+
+        # 3. Генерация security fixes
+        fixes = await self._generate_security_fixes(llm_analysis)
+
+        # 4. Расчёт security score, оценки и compliance
+        score, grade, compliance = self._evaluate(basic_checks, llm_analysis)
+
+        return {
+            "status": "analyzed",
+            "security_score": score,
+            "grade": grade,
+            "basic_checks": basic_checks,
+            "critical_issues": llm_analysis.get("critical_issues", []),
+            "warnings": llm_analysis.get("warnings", []),
+            "recommendations": llm_analysis.get("recommendations", []),
+            "auto_fixes": fixes,
+            "compliance": compliance
+        }
+
+    def _error_report(self, error: Exception) -> Dict[str, Any]:
+        """Отчёт при ошибке анализа"""
+        return {
+            "status": "error",
+            "error": str(error),
+            "security_score": 0
+        }
+
+    async def _parse(self, manifests: Dict[str, str]) -> Dict[str, List[Any]]:
+        """Разбирает манифесты; большие наборы - в отдельном потоке, не блокируя event loop"""
+        if sum(map(len, manifests.values())) > _PARSE_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._parse_all, manifests)
+        return self._parse_all(manifests)
+
+    def _parse_all(self, manifests: Dict[str, str]) -> Dict[str, List[Any]]:
+        """
+        Разбирает YAML манифесты один раз
+
+        Returns:
+            Документы по именам файлов (не .yaml и невалидные файлы пропускаются)
+        """
+        parsed = {}
 
         for filename, content in manifests.items():
             if not filename.endswith('.yaml'):
                 continue
 
+            key = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+            with self._parse_lock:
+                docs = self._parse_cache.get(key)
+                if docs is not None:
+                    self._parse_cache.move_to_end(key)
+            if docs is not None:
+                parsed[filename] = docs
+                continue
+
             try:
-                docs = list(yaml.safe_load_all(content))
+                docs = list(yaml.load_all(content, Loader=_YAML_LOADER))
+            except Exception as e:
+                logger.warning(f"Failed to parse {filename}: {e}")
+                continue
+
+            parsed[filename] = docs
+            with self._parse_lock:
+                self._parse_cache[key] = docs
+                if len(self._parse_cache) > _PARSE_CACHE_SIZE:
+                    self._parse_cache.popitem(last=False)
+
+        return parsed
+
+    def _run_basic_checks(self, parsed: Dict[str, List[Any]]) -> Dict[str, Any]:
+        """Базовые security проверки"""
+        checks = {
+            "security_context_present": False,
+            "run_as_non_root": False,
+            "privileged_containers": set(),
+            "host_network_usage": set(),
+            "host_path_volumes": set(),
+            "secrets_in_env": set(),
+            "capabilities_added": set(),
+            "resource_limits_set": False,
+            "readiness_probes_set": False,
+            "liveness_probes_set": False,
+            "network_policies_present": False,
+            "service_account_set": False,
+            "image_pull_policy": set(),
+            "trusted_registry": set()
+        }
+
+        for filename, docs in parsed.items():
+            try:
+                for doc in docs:
+                    if not doc:
+                        continue
+
+                    handler = self._KIND_HANDLERS.get(doc.get("kind"))
+                    if handler is not None:
+                        handler(self, doc, checks)
+
+            except Exception as e:
+                logger.warning(f"Failed to check {filename}: {e}")
+                continue
+
+        # Списочные проверки копятся в set (повторы одного образа/capability
+        # в нескольких манифестах схлопываются); наружу - отсортированные списки
+        for key, value in checks.items():
+            if isinstance(value, set):
+                checks[key] = sorted(value)
+
+        return checks
+
+    def _check_deployment(self, doc: Dict[str, Any], checks: Dict[str, Any]) -> None:
+        """Проверки Deployment: pod spec и контейнеры"""
+        name = doc.get("metadata", _EMPTY).get("name", "unnamed")
+        spec = doc.get("spec", _EMPTY).get("template", _EMPTY).get("spec", _EMPTY)
+
+        # Security context
+        pod_security = spec.get("securityContext", _EMPTY)
+        if pod_security:
+            checks["security_context_present"] = True
+            if pod_security.get("runAsNonRoot"):
+                checks["run_as_non_root"] = True
+
+        # Containers
+        for container in spec.get("containers", _NOTHING):
+            container_name = container.get("name", "unnamed")
+            container_security = container.get("securityContext", _EMPTY)
+
+            # Privileged
+            if container_security.get("privileged"):
+                checks["privileged_containers"].add(f"{name}/{container_name}")
+
+            # Capabilities
+            caps = container_security.get("capabilities", _EMPTY).get("add", _NOTHING)
+            if caps:
+                checks["capabilities_added"].update(f"{name}/{container_name}: {cap}" for cap in caps)
+
+            # Resource limits
+            if container.get("resources", _EMPTY).get("limits"):
+                checks["resource_limits_set"] = True
+
+            # Probes
+            if container.get("readinessProbe"):
+                checks["readiness_probes_set"] = True
+            if container.get("livenessProbe"):
+                checks["liveness_probes_set"] = True
+
+            # Image registry
+            image = container.get("image", "")
+            if image:
+                if image.startswith(_TRUSTED_REGISTRY_PREFIXES):
+                    checks["trusted_registry"].add(image)
+                else:
+                    checks["image_pull_policy"].add(f"{name}: {image}")
+
+            # Secrets in env
+            for env in container.get("env", _NOTHING):
+                # "value" - hardcoded secret
+                if "value" in env and _SECRET_ENV_RE.search(env.get("name", "")):
+                    checks["secrets_in_env"].add(f"{name}/{container_name}: {env['name']}")
+
+        # Host network
+        if spec.get("hostNetwork"):
+            checks["host_network_usage"].add(name)
+
+        # Host path volumes
+        for volume in spec.get("volumes", _NOTHING):
+            if volume.get("hostPath"):
+                checks["host_path_volumes"].add(f"{name}: {volume['hostPath']['path']}")
+
+        # Service account
+        if spec.get("serviceAccountName"):
+            checks["service_account_set"] = True
+
+    def _check_network_policy(self, doc: Dict[str, Any], checks: Dict[str, Any]) -> None:
+        """Проверки NetworkPolicy: достаточно её наличия"""
+        checks["network_policies_present"] = True
+
+    # kind -> проверка документа (остальные kind не проверяются)
+    _KIND_HANDLERS: Dict[str, Callable[["SecurityAnalyzer", Dict[str, Any], Dict[str, Any]], None]] = {
+        "Deployment": _check_deployment,
+        "NetworkPolicy": _check_network_policy
+    }
+
+    def _security_request(
+        self,
+        parsed: Dict[str, List[Any]],
+        basic_checks: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Параметры запроса к LLM (для messages.create и batch)"""
+
+        # Подготовить summary для LLM
+        manifest_summary = self._summarize_for_security(parsed)
+
+        content = "".join((
+            "МАНИФЕСТЫ:\n",
+            fast_json.dumps_pretty(manifest_summary),
+            "\n\nБАЗОВЫЕ ПРОВЕРКИ:\n",
+            fast_json.dumps_pretty(basic_checks)
+        ))
+
+        return {
+            "model": self.model,
+            "max_tokens": 2500,
+            "temperature": 0.1,  # Очень консервативно для security
+            "system": _SECURITY_SYSTEM,
+            "messages": [{"role": "user", "content": content}]
+        }
+
+    def _request_cache_key(self, request: Dict[str, Any]) -> str:
+        """Ключ кэша ответа LLM для запроса"""
+        return self.cache.cache_key(
+            "security",
+            request["model"],
+            request["temperature"],
+            request["system"],
+            request["messages"]
+        )
+
+    async def _llm_security_analysis(
+        self,
+        parsed: Dict[str, List[Any]],
+        basic_checks: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """LLM глубокий security анализ"""
+        request = self._security_request(parsed, basic_checks)
+        cache_key = self._request_cache_key(request)
 
+        try:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Security analysis served from cache")
+                return fast_json.loads(cached)
+
+            response = await self.llm.messages.create(**request)
+
+            # Извлечение текста из ответа
+            content = cast(TextBlock, response.content[0]).text
+
+            return await self._parse_llm_response(content, cache_key)
+
+        except Exception as e:
+            logger.error(f"LLM security analysis failed: {e}")
+            return self._llm_fallback(e)
+
+    async def _parse_llm_response(self, content: str, cache_key: str) -> Dict[str, Any]:
+        """Разбирает JSON ответ LLM и кэширует его"""
+
+        # Промпт просит ответ только в JSON - обычно он разбирается сразу;
+        # иначе ищем объект в markdown блоке ```json
+        try:
+            result = fast_json.loads(content)
+        except fast_json.JSONDecodeError:
+            match = _JSON_BLOCK_RE.search(content)
+            if match is None:
+                raise
+            content = match.group(1)
+            result = fast_json.loads(content)
+        logger.info(f"LLM found {len(result.get('critical_issues', []))} critical issues")
+
+        # Кэшируется только успешно разобранный ответ
+        await self.cache.set(cache_key, content)
+
+        return result
+
+    def _llm_fallback(self, error: Any) -> Dict[str, Any]:
+        """Результат анализа, когда LLM недоступен или ответ не разобран"""
+        return {
+            "critical_issues": [],
+            "warnings": [{"warning": f"LLM анализ не удался: {str(error)}"}],
+            "recommendations": [],
+            "compliance_issues": []
+        }
+
+    def _summarize_for_security(self, parsed: Dict[str, List[Any]]) -> List[Dict]:
+        """Создаёт summary для security анализа"""
+        summary = []
+
+        for filename, docs in parsed.items():
+            try:
                 for doc in docs:
                     if not doc:
                         continue
@@ -373,10 +651,11 @@ class SecurityAnalyzer:
 
                         containers = spec.get("containers", [])
                         if containers:
-                            c = containers[0]
-                            info["containerSecurityContext"] = c.get("securityContext", {})
-                            info["image"] = c.get("image", "")
-                            info["hasResourceLimits"] = bool(c.get("resources", {}).get("limits"))
+                            c = _ContainerView.from_raw(containers[0])
+                            # dict() - summary сериализуется в JSON
+                            info["containerSecurityContext"] = dict(c.security_context)
+                            info["image"] = c.image
+                            info["hasResourceLimits"] = c.has_limits
 
                     summary.append(info)
 
@@ -391,13 +670,15 @@ class SecurityAnalyzer:
         fixes = []
 
         for issue in llm_analysis.get("critical_issues", []):
+            # Тип считается один раз на issue и передаётся дальше
+            fix_type = self._determine_fix_type(issue)
             fix = {
                 "issue": issue.get("issue"),
                 "severity": issue.get("severity"),
                 "affected": issue.get("affected"),
-                "fix_type": self._determine_fix_type(issue),
-                "auto_applicable": self._is_auto_fixable(issue),
-                "kubectl_command": self._generate_kubectl_fix(issue)
+                "fix_type": fix_type,
+                "auto_applicable": self._is_auto_fixable(fix_type),
+                "kubectl_command": self._generate_kubectl_fix(issue, fix_type)
             }
             fixes.append(fix)
 
@@ -405,33 +686,15 @@ class SecurityAnalyzer:
 
     def _determine_fix_type(self, issue: Dict) -> str:
         """Определяет тип исправления"""
-        issue_text = issue.get("issue", "").lower()
-
-        if "security context" in issue_text or "runasnonroot" in issue_text:
-            return "add_security_context"
-        elif "privileged" in issue_text:
-            return "remove_privileged"
-        elif "secret" in issue_text or "password" in issue_text:
-            return "move_to_secret"
-        elif "network policy" in issue_text:
-            return "add_network_policy"
-        elif "resource limit" in issue_text:
-            return "add_resource_limits"
-        else:
-            return "manual_review_required"
+        match = _FIX_TYPE_RE.match(issue.get("issue") or "")
+        return match.lastgroup if match else "manual_review_required"
 
-    def _is_auto_fixable(self, issue: Dict) -> bool:
+    def _is_auto_fixable(self, fix_type: str) -> bool:
         """Проверяет возможность автофикса"""
-        auto_fixable_types = [
-            "add_security_context",
-            "add_resource_limits",
-            "add_network_policy"
-        ]
-        return self._determine_fix_type(issue) in auto_fixable_types
-
-    def _generate_kubectl_fix(self, issue: Dict) -> Optional[str]:
+        return fix_type in _AUTO_FIXABLE_TYPES
+
+    def _generate_kubectl_fix(self, issue: Dict, fix_type: str) -> Optional[str]:
         """Генерирует kubectl команду для исправления"""
-        fix_type = self._determine_fix_type(issue)
         affected = issue.get("affected", "")
 
         if fix_type == "add_security_context":
@@ -443,12 +706,23 @@ class SecurityAnalyzer:
 
         return None
 
-    def _calculate_security_score(
+    def _evaluate(
         self,
         basic_checks: Dict[str, Any],
         llm_analysis: Dict[str, Any]
-    ) -> int:
-        """Рассчитывает security score (0-100)"""
+    ) -> Tuple[int, str, Dict[str, bool]]:
+        """
+        Рассчитывает security score (0-100), оценку и соответствие стандартам
+
+        Каждый ключ basic_checks читается один раз
+        """
+        security_context_present = basic_checks.get("security_context_present", False)
+        run_as_non_root = basic_checks.get("run_as_non_root", False)
+        privileged_containers = basic_checks.get("privileged_containers")
+        secrets_in_env = basic_checks.get("secrets_in_env")
+        resource_limits_set = basic_checks.get("resource_limits_set", False)
+        network_policies_present = basic_checks.get("network_policies_present", False)
+
         score = 100
 
         # Вычитаем за проблемы
@@ -459,20 +733,38 @@ class SecurityAnalyzer:
         score -= warnings * 5  # -5 за каждое warning
 
         # Вычитаем за отсутствие базовых мер
-        if not basic_checks.get("security_context_present"):
+        if not security_context_present:
             score -= 10
-        if not basic_checks.get("run_as_non_root"):
+        if not run_as_non_root:
             score -= 10
-        if basic_checks.get("privileged_containers"):
+        if privileged_containers:
             score -= 20
-        if basic_checks.get("secrets_in_env"):
+        if secrets_in_env:
             score -= 15
-        if not basic_checks.get("resource_limits_set"):
+        if not resource_limits_set:
             score -= 10
-        if not basic_checks.get("network_policies_present"):
+        if not network_policies_present:
             score -= 10
 
-        return max(0, min(100, score))
+        score = max(0, min(100, score))
+
+        compliance = {
+            "pod_security_baseline": (
+                security_context_present and
+                not privileged_containers
+            ),
+            "pod_security_restricted": (
+                run_as_non_root and
+                resource_limits_set and
+                not basic_checks.get("host_network_usage")
+            ),
+            "zero_trust_ready": (
+                network_policies_present and
+                basic_checks.get("service_account_set", False)
+            )
+        }
+
+        return score, self._get_security_grade(score), compliance
 
     def _get_security_grade(self, score: int) -> str:
         """Переводит score в оценку"""
@@ -486,21 +778,3 @@ class SecurityAnalyzer:
             return "D (Требуется улучшение)"
         else:
             return "F (Критично)"
-
-    def _check_compliance(self, basic_checks: Dict[str, Any]) -> Dict[str, bool]:
-        """Проверяет соответствие стандартам"""
-        return {
-            "pod_security_baseline": (
-                basic_checks.get("security_context_present", False) and
-                not basic_checks.get("privileged_containers")
-            ),
-            "pod_security_restricted": (
-                basic_checks.get("run_as_non_root", False) and
-                basic_checks.get("resource_limits_set", False) and
-                not basic_checks.get("host_network_usage")
-            ),
-            "zero_trust_ready": (
-                basic_checks.get("network_policies_present", False) and
-                basic_checks.get("service_account_set", False)
-            )
-        }
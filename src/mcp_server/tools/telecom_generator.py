@@ -3,6 +3,7 @@
 Специализируется на 5G компонентах, биллинге, RabbitMQ и других телеком-сервисах
 """
 
+from functools import cache
 from typing import Dict, Any, List
 from pathlib import Path
 import yaml
@@ -109,70 +110,8 @@ TELECOM_COMPONENTS = {
 }
 
 
-class TelecomGenerator:
-    """Генератор телеком-конфигураций"""
-
-    def __init__(self, templates_dir: str = "templates/telecom"):
-        self.templates_dir = Path(templates_dir)
-        self.base_templates_dir = Path("templates/k8s")
-
-    def identify_component(self, prompt: str) -> str:
-        """
-        Определяет тип компонента из промпта
-
-        Args:
-            prompt: Текст запроса
-
-        Returns:
-            Тип компонента или 'generic'
-        """
-        prompt_lower = prompt.lower()
-
-        # Поиск по ключевым словам
-        if any(word in prompt_lower for word in ["upf", "user plane"]):
-            return "5g_upf"
-        elif any(word in prompt_lower for word in ["amf", "access mobility"]):
-            return "5g_amf"
-        elif any(word in prompt_lower for word in ["smf", "session management"]):
-            return "5g_smf"
-        elif any(word in prompt_lower for word in ["billing", "биллинг", "тарификация"]):
-            return "billing"
-        elif "rabbitmq" in prompt_lower:
-            return "rabbitmq"
-        elif "redis" in prompt_lower:
-            return "redis"
-        else:
-            return "generic"
-
-    def get_component_config(self, component_type: str) -> Dict[str, Any]:
-        """Получить конфигурацию компонента"""
-        return TELECOM_COMPONENTS.get(component_type, {})
-
-    def generate_deployment_yaml(
-        self,
-        component_type: str,
-        service_name: str,
-        namespace: str = "telecom",
-        custom_params: Dict[str, Any] | None = None
-    ) -> str:
-        """
-        Генерирует Deployment YAML для телеком-компонента
-
-        Args:
-            component_type: Тип компонента
-            service_name: Имя сервиса
-            namespace: Namespace K8s
-            custom_params: Дополнительные параметры
-
-        Returns:
-            YAML манифест
-        """
-        config = self.get_component_config(component_type)
-        if custom_params:
-            config = {**config, **custom_params}
-
-        # Базовый шаблон Deployment
-        template_str = """
+# Базовый шаблон Deployment для телеком-компонентов
+_DEPLOYMENT_TEMPLATE_SOURCE = """
 apiVersion: apps/v1
 kind: Deployment
 metadata:
@@ -328,14 +267,82 @@ spec:
       {% endif %}
 """
 
+
+@cache
+def _deployment_template() -> Template:
+    """Шаблон Deployment компилируется один раз на процесс, а не на каждый вызов"""
+    return Template(_DEPLOYMENT_TEMPLATE_SOURCE)
+
+
+class TelecomGenerator:
+    """Генератор телеком-конфигураций"""
+
+    def __init__(self, templates_dir: str = "templates/telecom"):
+        self.templates_dir = Path(templates_dir)
+        self.base_templates_dir = Path("templates/k8s")
+
+    def identify_component(self, prompt: str) -> str:
+        """
+        Определяет тип компонента из промпта
+
+        Args:
+            prompt: Текст запроса
+
+        Returns:
+            Тип компонента или 'generic'
+        """
+        prompt_lower = prompt.lower()
+
+        # Поиск по ключевым словам
+        if any(word in prompt_lower for word in ["upf", "user plane"]):
+            return "5g_upf"
+        elif any(word in prompt_lower for word in ["amf", "access mobility"]):
+            return "5g_amf"
+        elif any(word in prompt_lower for word in ["smf", "session management"]):
+            return "5g_smf"
+        elif any(word in prompt_lower for word in ["billing", "биллинг", "тарификация"]):
+            return "billing"
+        elif "rabbitmq" in prompt_lower:
+            return "rabbitmq"
+        elif "redis" in prompt_lower:
+            return "redis"
+        else:
+            return "generic"
+
+    def get_component_config(self, component_type: str) -> Dict[str, Any]:
+        """Получить конфигурацию компонента"""
+        return TELECOM_COMPONENTS.get(component_type, {})
+
+    def generate_deployment_yaml(
+        self,
+        component_type: str,
+        service_name: str,
+        namespace: str = "telecom",
+        custom_params: Dict[str, Any] | None = None
+    ) -> str:
+        """
+        Генерирует Deployment YAML для телеком-компонента
+
+        Args:
+            component_type: Тип компонента
+            service_name: Имя сервиса
+            namespace: Namespace K8s
+            custom_params: Дополнительные параметры
+
+        Returns:
+            YAML манифест
+        """
+        config = self.get_component_config(component_type)
+        if custom_params:
+            config = {**config, **custom_params}
+
         # Генерируем IP адреса для сетей
         network_ips = []
         if config.get('networks'):
             for idx in range(len(config['networks'])):
                 network_ips.append(NetworkConfig.get_ip(100 + idx))
 
-        template = Template(template_str)
-        yaml_content = template.render(
+        yaml_content = _deployment_template().render(
             component_type=component_type,
             service_name=service_name,
             namespace=namespace,
@@ -6,6 +6,7 @@
 import sys
 import os
 import logging
+import subprocess
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +36,6 @@ def fix_windows_encoding():
             return False
 
         # Попытка установить UTF-8 через chcp (Windows)
-        import subprocess
         try:
             # Выполняем chcp 65001 (UTF-8)
             result = subprocess.run(
@@ -0,0 +1,75 @@
+"""
+Быстрый JSON (orjson) с fallback на стандартный json
+Используется для разбора ответов LLM и сериализации результатов
+"""
+
+import asyncio
+import json
+import re
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# orjson.JSONDecodeError - подкласс json.JSONDecodeError,
+# поэтому ловить можно одно и то же исключение в обоих режимах
+JSONDecodeError = json.JSONDecodeError
+
+# Начиная с этого размера разбор уходит в поток, чтобы не блокировать
+# event loop; на маленьких строках передача в пул дороже самого разбора
+ASYNC_THREAD_THRESHOLD = 16 * 1024
+
+# Висячая запятая перед } или ] - частая ошибка в JSON от LLM
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def loads(data: str | bytes) -> Any:
+    """Разбирает JSON строку"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def loads_lenient(data: str) -> Any:
+    """
+    Разбирает почти валидный JSON (ответы LLM)
+
+    Сначала обычный разбор; при ошибке - повтор по тексту от первой {
+    до последней } без висячих запятых. Если и это не помогло -
+    исходный JSONDecodeError
+    """
+    try:
+        return loads(data)
+    except JSONDecodeError as error:
+        start, end = data.find("{"), data.rfind("}")
+        candidate = data[start:end + 1] if 0 <= start < end else data
+        candidate = _TRAILING_COMMA_RE.sub(r"\1", candidate)
+        try:
+            return loads(candidate)
+        except JSONDecodeError:
+            raise error from None
+
+
+async def aloads(data: str | bytes, lenient: bool = False) -> Any:
+    """Разбирает JSON строку, большие документы - в отдельном потоке"""
+    parse = loads_lenient if lenient else loads
+    if len(data) > ASYNC_THREAD_THRESHOLD:
+        return await asyncio.to_thread(parse, data)
+    return parse(data)
+
+
+def dumps(obj: Any) -> str:
+    """Компактная сериализация в JSON (UTF-8 без экранирования кириллицы)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_pretty(obj: Any) -> str:
+    """Сериализация в JSON с отступом 2 (UTF-8 без экранирования кириллицы)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, indent=2, ensure_ascii=False)
@@ -4,10 +4,13 @@
 
 import os
 import re
+import stat
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable
 from pathlib import Path
 
+from ..config import ValidationConfig
+
 logger = logging.getLogger(__name__)
 
 
@@ -198,34 +201,49 @@ class SecurityValidator:
         return result
 
 
-def validate_api_key(api_key: Optional[str]) -> bool:
+def _make_api_key_validator(min_length: int) -> Callable[[Optional[str]], bool]:
     """
-    Валидирует Anthropic API ключ
+    Создаёт валидатор API ключа с зафиксированной минимальной длиной
 
     Args:
-        api_key: API ключ для проверки
+        min_length: Минимальная длина ключа (ValidationConfig.MIN_API_KEY_LENGTH)
 
     Returns:
-        True если валиден, False иначе
+        Функция validate_api_key
     """
-    if not api_key:
-        logger.error("API ключ отсутствует")
-        return False
+    def validate_api_key(api_key: Optional[str]) -> bool:
+        """
+        Валидирует Anthropic API ключ
+
+        Args:
+            api_key: API ключ для проверки
+
+        Returns:
+            True если валиден, False иначе
+        """
+        if not api_key:
+            logger.error("API ключ отсутствует")
+            return False
+
+        if api_key == 'your-api-key-here':
+            logger.error("API ключ содержит placeholder значение")
+            return False
+
+        if not api_key.startswith('sk-ant-'):
+            logger.warning("API ключ не соответствует ожидаемому формату (должен начинаться с 'sk-ant-')")
+            return False
+
+        if len(api_key) < min_length:
+            logger.error("API ключ слишком короткий")
+            return False
 
-    if api_key == 'your-api-key-here':
-        logger.error("API ключ содержит placeholder значение")
-        return False
+        logger.info("✅ API ключ прошел базовую валидацию")
+        return True
 
-    if not api_key.startswith('sk-ant-'):
-        logger.warning("API ключ не соответствует ожидаемому формату (должен начинаться с 'sk-ant-')")
-        return False
+    return validate_api_key
 
-    if len(api_key) < 20:
-        logger.error("API ключ слишком короткий")
-        return False
 
-    logger.info("✅ API ключ прошел базовую валидацию")
-    return True
+validate_api_key = _make_api_key_validator(ValidationConfig.MIN_API_KEY_LENGTH)
 
 
 def sanitize_secret_value(value: str, placeholder: str = "***REDACTED***") -> str:
@@ -278,7 +296,6 @@ def check_file_permissions(file_path: str) -> Dict[str, Any]:
             result['permissions'] = 'windows (проверка ограничена)'
             logger.debug(f"Windows detected - permissions check limited for {file_path}")
         else:
-            import stat
             mode = path.stat().st_mode
             result['permissions'] = oct(stat.S_IMODE(mode))
 
@@ -0,0 +1,96 @@
+"""
+Unit тесты для ClaudeClient
+Разбор ответов модели без реальных запросов к API
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+claude_client = pytest.importorskip("src.mcp_server.llm.claude_client")
+ClaudeClient = claude_client.ClaudeClient
+
+
+def _respond_with(client, text):
+    """Подменяет запрос к API ответом с заданным текстом"""
+    async def create_message(**kwargs):
+        return SimpleNamespace(content=[claude_client.TextBlock(type="text", text=text)])
+
+    client.model = "test-model"
+    client._analyze_system_cached = ClaudeClient._cached_block("system")
+    client._create_message = create_message
+
+
+class TestClaudeClient:
+    """Тесты разбора ответов Claude"""
+
+    @pytest.fixture
+    def client(self):
+        """Фикстура с клиентом без подключения к API"""
+        return ClaudeClient.__new__(ClaudeClient)
+
+    def test_extract_code_block(self, client):
+        """Тест извлечения кода из markdown блока"""
+        content = "Вот манифест:\n```yaml\nkind: Service\n```\n```json\n{\"a\": 1}\n```"
+
+        assert client._extract_code_block(content, "json") == '{"a": 1}'
+        assert client._extract_code_block(content, "python") == "kind: Service"
+        assert client._extract_code_block("```yaml\nkind: Pod") == "kind: Pod"
+        assert client._extract_code_block("без блоков") == "без блоков"
+
+    def test_extract_code_block_single_line(self, client):
+        """Тест блока в одну строку: ```json {...}```"""
+        assert client._extract_code_block('```json {"a": 1}```', "json") == '{"a": 1}'
+        assert client._extract_code_block('```{"a": 1}```', "json") == '{"a": 1}'
+
+    def test_close_shared_http_client(self):
+        """Тест: после закрытия общего пула следующий клиент получает новый"""
+        first = claude_client._shared_http_client()
+        asyncio.run(claude_client.close_shared_http_client())
+
+        assert first.is_closed
+        second = claude_client._shared_http_client()
+        assert second is not first
+        assert not second.is_closed
+
+        asyncio.run(claude_client.close_shared_http_client())
+        # Повторный вызов без созданного клиента - no-op
+        asyncio.run(claude_client.close_shared_http_client())
+
+    def test_analyze_prompt_valid_json(self, client):
+        """Тест: валидный JSON от модели возвращается как есть"""
+        raw = '{"component_type": "5g_upf", "service_name": "moscow-upf"}'
+        _respond_with(client, f"```json\n{raw}\n```")
+
+        analysis, analysis_json = asyncio.run(client._analyze_prompt("Deploy UPF"))
+
+        assert analysis["service_name"] == "moscow-upf"
+        assert analysis_json == raw
+
+    def test_analyze_prompt_repaired_json(self, client):
+        """Тест: после починки JSON возвращается валидный JSON, а не исходный текст"""
+        _respond_with(client, 'Вот анализ: {"component_type": "5g_upf", "special_requirements": ["low_latency",],} Готово')
+
+        analysis, analysis_json = asyncio.run(client._analyze_prompt("Deploy UPF"))
+
+        assert analysis == {"component_type": "5g_upf", "special_requirements": ["low_latency"]}
+        assert json.loads(analysis_json) == analysis
+
+    def test_create_message_timeout_per_attempt(self, client):
+        """Тест: timeout передаётся в SDK на каждую попытку, итоговый timeout - RuntimeError"""
+        calls = []
+
+        class FakeMessages:
+            async def create(self, **kwargs):
+                calls.append(kwargs)
+                raise claude_client.APITimeoutError(request=None)
+
+        client.client = SimpleNamespace(messages=FakeMessages())
+        client._semaphore = asyncio.Semaphore(1)
+
+        with pytest.raises(RuntimeError, match="timeout"):
+            asyncio.run(client._create_message(timeout=12.0, model="test-model"))
+
+        assert calls == [{"timeout": 12.0, "model": "test-model"}]
@@ -0,0 +1,101 @@
+"""
+Unit тесты для config
+Парсинг переменных окружения и генерация сетевых/Docker имен
+"""
+
+import pytest
+from src.mcp_server import config
+from src.mcp_server.config import _env_bool, _NetworkConfig, UIConfig
+
+
+class TestEnvBool:
+    """Тесты парсинга булевых переменных окружения"""
+
+    @pytest.mark.parametrize("value", ["true", "True", "1", "yes", "on", " TRUE "])
+    def test_truthy_values(self, monkeypatch, value):
+        """Тест значений, которые считаются истинными"""
+        monkeypatch.setenv("MTS_TEST_FLAG", value)
+        assert _env_bool("MTS_TEST_FLAG") is True
+
+    @pytest.mark.parametrize("value", ["false", "0", "no", "off", ""])
+    def test_falsy_values(self, monkeypatch, value):
+        """Тест значений, которые считаются ложными"""
+        monkeypatch.setenv("MTS_TEST_FLAG", value)
+        assert _env_bool("MTS_TEST_FLAG") is False
+
+    def test_default_when_unset(self, monkeypatch):
+        """Тест значения по умолчанию если переменная не задана"""
+        monkeypatch.delenv("MTS_TEST_FLAG", raising=False)
+        assert _env_bool("MTS_TEST_FLAG") is False
+        assert _env_bool("MTS_TEST_FLAG", "true") is True
+
+
+class TestNetworkConfig:
+    """Тесты таблиц subnet/IP/gateway"""
+
+    def test_addresses_for_custom_base(self):
+        """Тест генерации адресов для нестандартной базовой сети"""
+        config = _NetworkConfig(BASE_NETWORK="172.16")
+
+        assert config.get_subnet(5) == "172.16.5.0/24"
+        assert config.get_ip(5) == "172.16.5.10"
+        assert config.get_gateway(5) == "172.16.5.1"
+        assert config.get_ip(255) == "172.16.255.10"
+
+    def test_base_network_read_on_creation(self, monkeypatch):
+        """Тест что окружение читается при создании конфига, а не при импорте"""
+        monkeypatch.setenv("TELECOM_NETWORK_BASE", "10.200")
+
+        assert _NetworkConfig().get_subnet(1) == "10.200.1.0/24"
+
+    @pytest.mark.parametrize("index", [-1, 256])
+    def test_out_of_range_index(self, index):
+        """Тест что индекс вне диапазона октета отклоняется"""
+        config = _NetworkConfig()
+
+        with pytest.raises(ValueError):
+            config.get_subnet(index)
+
+
+class TestUIConfig:
+    """Тесты символов статусов"""
+
+    def test_item_access_matches_symbols(self):
+        """Тест что UIConfig[key] совпадает с get_symbols()[key]"""
+        symbols = UIConfig.get_symbols()
+
+        for key in ("success", "error", "warning", "rocket"):
+            assert UIConfig[key] == symbols[key]
+
+    def test_explicit_env_skips_detection(self, monkeypatch):
+        """Тест что явный USE_EMOJI не вызывает автодетект"""
+        monkeypatch.setenv("USE_EMOJI", "false")
+        config._use_emoji.cache_clear()
+        config._detect_emoji_support.cache_clear()
+        try:
+            assert UIConfig.USE_EMOJI is False
+            assert UIConfig["success"] == "[OK]"
+            assert config._detect_emoji_support.cache_info().misses == 0
+        finally:
+            config._use_emoji.cache_clear()
+
+    def test_unknown_symbol(self):
+        """Тест неизвестного ключа"""
+        with pytest.raises(KeyError):
+            UIConfig["unknown"]
+
+
+class TestDockerConfig:
+    """Тесты имён Docker образов"""
+
+    def test_default_tag(self):
+        """Тест: без тега и с tag=None используется latest"""
+        docker = config._DockerConfig(REGISTRY="registry.mts.ru", ORGANIZATION="telecom")
+
+        assert docker.get_image_name("5g_upf") == "registry.mts.ru/telecom/5g_upf:latest"
+        assert docker.get_image_name("5g_upf", None) == "registry.mts.ru/telecom/5g_upf:latest"
+        assert docker.get_image_name("5g_upf", "v1.2.3") == "registry.mts.ru/telecom/5g_upf:v1.2.3"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,8 +1,12 @@
-""
+"""
 Unit тесты для CostOptimizer
 Тестирование анализа стоимости и оптимизаций
 """
 
+import asyncio
+import threading
+from collections import OrderedDict
+
 import pytest
 from src.mcp_server.tools.cost_optimizer import CostOptimizer
 
@@ -22,6 +26,8 @@ class TestCostOptimizer:
                     "storage_gb": 50,
                     "spot_discount": 0.65
                 }
+                self._parse_cache = OrderedDict()
+                self._parse_lock = threading.Lock()
 
         return MockCostOptimizer()
 
@@ -57,6 +63,18 @@ class TestCostOptimizer:
             assert abs(result - expected_gb) < 0.01, \
                 f"Memory '{mem_str}' должна парситься в ~{expected_gb} GB"
 
+    def test_extract_json(self, optimizer):
+        """Тест извлечения JSON из markdown блока"""
+        test_cases = [
+            ('{"changes": []}', '{"changes": []}'),
+            ('Ответ:\n```json\n{"changes": []}\n```\nГотово', '{"changes": []}'),
+            ('```\n{"changes": []}\n```', '{"changes": []}'),
+            ('```json\n{"changes": [', '{"changes": ['),  # обрезанный ответ
+        ]
+
+        for content, expected in test_cases:
+            assert optimizer._extract_json(content) == expected
+
     def test_cost_calculation_simple(self, optimizer):
         """Тест расчета стоимости простого манифеста"""
         simple_manifest = """
@@ -77,7 +95,7 @@ spec:
 """
 
         manifests = {"deployment.yaml": simple_manifest}
-        cost = optimizer._calculate_current_cost(manifests)
+        cost = optimizer._calculate_current_cost(optimizer._parse_all(manifests))
 
         # Ожидаемая стоимость:
         # CPU: 1 core * 1500 руб * 3 replicas = 4500 руб
@@ -111,7 +129,7 @@ spec:
 """
 
         manifests = {"deployment.yaml": multi_container_manifest}
-        cost = optimizer._calculate_current_cost(manifests)
+        cost = optimizer._calculate_current_cost(optimizer._parse_all(manifests))
 
         # App: 0.5 cores * 1500 + 1 GB * 600 = 1350 руб
         # Sidecar: 0.2 cores * 1500 + 0.5 GB * 600 = 600 руб
@@ -120,6 +138,30 @@ spec:
         expected_cost = ((0.5 * 1500 + 1 * 600) + (0.2 * 1500 + 0.5 * 600)) * 2
         assert abs(cost - expected_cost) < 1
 
+    def test_cost_calculation_pvc(self, optimizer):
+        """Тест учёта стоимости PersistentVolumeClaim"""
+        pvc_manifest = """
+apiVersion: v1
+kind: PersistentVolumeClaim
+metadata:
+  name: data
+spec:
+  resources:
+    requests:
+      storage: 10Gi
+---
+apiVersion: v1
+kind: Service
+metadata:
+  name: test-app
+"""
+
+        manifests = {"pvc.yaml": pvc_manifest}
+        cost = optimizer._calculate_current_cost(optimizer._parse_all(manifests))
+
+        # Storage: 10 GB * 50 руб = 500 руб/мес, Service бесплатен
+        assert abs(cost - 10 * 50) < 1
+
     def test_summarize_manifests(self, optimizer):
         """Тест создания summary для LLM"""
         test_manifest = """
@@ -140,7 +182,7 @@ spec:
 """
 
         manifests = {"deployment.yaml": test_manifest}
-        summary = optimizer._summarize_manifests(manifests)
+        summary = optimizer._summarize_manifests(optimizer._parse_all(manifests))
 
         assert len(summary) == 1
         assert summary[0]["kind"] == "Deployment"
@@ -182,17 +224,139 @@ spec:
             ]
         }
 
-        optimized = optimizer._apply_optimizations(manifests, optimization)
+        optimized = optimizer._apply_optimizations(manifests, optimizer._parse_all(manifests), optimization)
 
         # Проверяем что replicas изменились
         import yaml
         optimized_manifest = yaml.safe_load(optimized["deployment.yaml"])
         assert optimized_manifest["spec"]["replicas"] == 3
 
+    def test_apply_optimizations_reduce_cpu_memory(self, optimizer):
+        """Тест изменения requests, в том числе у контейнера без resources"""
+        manifest = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: test-app
+spec:
+  template:
+    spec:
+      containers:
+      - name: app
+        resources:
+          requests:
+            cpu: "1"
+            memory: "2Gi"
+      - name: sidecar
+"""
+        manifests = {"deployment.yaml": manifest}
+        optimization = {
+            "changes": [
+                {"type": "reduce_cpu", "target": "test-app", "to": "500m"},
+                {"type": "reduce_memory", "target": "test-app", "to": "1Gi"}
+            ]
+        }
+
+        parsed = optimizer._parse_all(manifests)
+        optimizer._apply_optimizations(manifests, parsed, optimization)
+
+        app, sidecar = parsed["deployment.yaml"][0]["spec"]["template"]["spec"]["containers"]
+        assert app["resources"]["requests"] == {"cpu": "500m", "memory": "1Gi"}
+        assert sidecar["resources"]["requests"] == {"cpu": "500m", "memory": "1Gi"}
+
+    def test_apply_optimizations_keeps_untouched_files(self, optimizer):
+        """Тест что файлы без изменений возвращаются исходными строками"""
+        deployment = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: test-app
+spec:
+  replicas: 5
+"""
+        service = """
+# Комментарий должен сохраниться
+apiVersion: v1
+kind: Service
+metadata:
+  name: test-app-svc
+"""
+
+        manifests = {"deployment.yaml": deployment, "service.yaml": service, "README.md": "# docs"}
+        parsed = optimizer._parse_all(manifests)
+        optimization = {"changes": [{"type": "reduce_replicas", "target": "test-app", "to": "2"}]}
+
+        optimized = optimizer._apply_optimizations(manifests, parsed, optimization)
+
+        assert optimized["service.yaml"] is service
+        assert optimized["README.md"] is manifests["README.md"]
+        assert optimized["deployment.yaml"] != deployment
+        # Документы изменены на месте - повторный разбор не нужен
+        assert parsed["deployment.yaml"][0]["spec"]["replicas"] == 2
+
+    def test_apply_optimizations_by_target_name(self, optimizer):
+        """Тест что изменение применяется только к Deployment с именем target"""
+        manifests = {
+            "a.yaml": "kind: Deployment\nmetadata: {name: a}\nspec: {replicas: 5}\n",
+            "b.yaml": (
+                "kind: Service\nmetadata: {name: b}\nspec: {replicas: 5}\n"
+                "---\n"
+                "kind: Deployment\nmetadata: {name: b}\nspec: {replicas: 5}\n"
+            ),
+        }
+        parsed = optimizer._parse_all(manifests)
+        optimization = {"changes": [
+            {"type": "reduce_replicas", "target": "b", "to": "2"},
+            {"type": "reduce_replicas", "target": "missing", "to": "1"},
+        ]}
+
+        optimized = optimizer._apply_optimizations(manifests, parsed, optimization)
+
+        assert optimized["a.yaml"] is manifests["a.yaml"]
+        service, deployment = parsed["b.yaml"]
+        assert service["spec"]["replicas"] == 5
+        assert deployment["spec"]["replicas"] == 2
+
+    def test_parse_cache_not_mutated_by_optimizations(self, optimizer):
+        """Тест: повторный анализ берёт документы из кэша нетронутыми"""
+        manifest = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: app
+spec:
+  replicas: 3
+"""
+        manifests = {"deployment.yaml": manifest}
+        optimization = {"changes": [{"type": "reduce_replicas", "target": "app", "to": "1"}]}
+
+        parsed = optimizer._parse_all(manifests)
+        optimizer._apply_optimizations(manifests, parsed, optimization)
+        assert parsed["deployment.yaml"][0]["spec"]["replicas"] == 1
+
+        reparsed = optimizer._parse_all(manifests)
+        assert reparsed["deployment.yaml"][0]["spec"]["replicas"] == 3
+        assert len(optimizer._parse_cache) == 1
+
+    def test_analyze_without_deployments_skips_llm(self, optimizer, monkeypatch):
+        """Тест: без Deployment запрос к LLM не отправляется"""
+        async def fail(*args, **kwargs):
+            raise AssertionError("LLM не должен вызываться")
+
+        monkeypatch.setattr(optimizer, "_llm_optimize", fail)
+        manifests = {"service.yaml": "apiVersion: v1\nkind: Service\nmetadata:\n  name: app\n"}
+
+        analysis = asyncio.run(optimizer.analyze_costs(manifests, "staging"))
+
+        assert analysis["status"] == "analyzed"
+        assert analysis["savings_monthly"] == 0
+        assert analysis["optimizations"] == []
+        assert analysis["optimized_manifests"] == manifests
+
     def test_zero_cost_handling(self, optimizer):
         """Тест обработки случая нулевой стоимости"""
         empty_manifests = {}
-        cost = optimizer._calculate_current_cost(empty_manifests)
+        cost = optimizer._calculate_current_cost(optimizer._parse_all(empty_manifests))
 
         assert cost == 0.0
 
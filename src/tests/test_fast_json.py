@@ -0,0 +1,77 @@
+"""
+Unit тесты для fast_json
+Одинаковое поведение с orjson и со стандартным json
+"""
+
+import asyncio
+import json
+import pytest
+from src.mcp_server.utils import fast_json
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    """Прогоняет тест с orjson (если установлен) и без него"""
+    if request.param == "orjson":
+        if fast_json.orjson is None:
+            pytest.skip("orjson не установлен")
+    else:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    return request.param
+
+
+class TestFastJson:
+    """Тесты сериализации и разбора"""
+
+    def test_roundtrip_cyrillic(self, backend):
+        """Тест что кириллица не экранируется"""
+        data = {"service_name": "москва-upf", "replicas": 3}
+
+        assert "москва-upf" in fast_json.dumps(data)
+        assert fast_json.loads(fast_json.dumps(data)) == data
+
+    def test_pretty_matches_stdlib(self, backend):
+        """Тест что dumps_pretty совпадает с json.dumps(indent=2, ensure_ascii=False)"""
+        data = {"component_type": "5g_upf", "requirements": ["low_latency"], "cpu": {"requests": "2"}}
+
+        assert fast_json.dumps_pretty(data) == json.dumps(data, indent=2, ensure_ascii=False)
+
+    def test_invalid_json(self, backend):
+        """Тест что ошибка разбора - json.JSONDecodeError"""
+        with pytest.raises(fast_json.JSONDecodeError):
+            fast_json.loads('{"replicas": 3,}')
+
+    @pytest.mark.parametrize("content", [
+        '{"replicas": 3,}',
+        '{"ports": [80, 443,], "replicas": 3}',
+        'Вот параметры:\n{"replicas": 3}\nГотово.',
+    ])
+    def test_loads_lenient_repairs(self, backend, content):
+        """Тест что почти валидный JSON от LLM разбирается"""
+        assert fast_json.loads_lenient(content)["replicas"] == 3
+
+    def test_loads_lenient_gives_up(self, backend):
+        """Тест что безнадёжный текст даёт JSONDecodeError"""
+        with pytest.raises(fast_json.JSONDecodeError):
+            fast_json.loads_lenient("replicas: 3")
+
+    def test_aloads_large_document(self, backend, monkeypatch):
+        """Тест что большой документ разбирается в потоке"""
+        calls = []
+
+        async def fake_to_thread(func, *args):
+            calls.append(func)
+            return func(*args)
+
+        monkeypatch.setattr(fast_json.asyncio, "to_thread", fake_to_thread)
+        small = '{"a": 1}'
+        large = fast_json.dumps({"items": ["x" * 100] * 200})
+
+        assert asyncio.run(fast_json.aloads(small)) == {"a": 1}
+        assert calls == []
+        assert len(asyncio.run(fast_json.aloads(large))["items"]) == 200
+        assert calls == [fast_json.loads]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,89 @@
+"""
+Unit тесты для кэша ответов LLM
+"""
+
+import asyncio
+import pytest
+from src.mcp_server.llm.cache import LLMCache, MemoryBackend, FileBackend
+
+
+class TestCacheKey:
+    """Тесты ключа кэша"""
+
+    def test_same_request_same_key(self):
+        """Тест что одинаковые запросы дают одинаковый ключ"""
+        system = [{"type": "text", "text": "system"}]
+        messages = [{"role": "user", "content": "Манифест"}]
+
+        key1 = LLMCache.cache_key("optimize", "model", 0.2, system, messages)
+        key2 = LLMCache.cache_key("optimize", "model", 0.2, list(system), list(messages))
+
+        assert key1 == key2
+
+    def test_key_depends_on_parameters(self):
+        """Тест что ключ меняется при изменении любого параметра"""
+        base = ("optimize", "model", 0.2, "system", [{"role": "user", "content": "a"}])
+        key = LLMCache.cache_key(*base)
+
+        assert LLMCache.cache_key("analyze", *base[1:]) != key
+        assert LLMCache.cache_key(*base[:2], 0.5, *base[3:]) != key
+        assert LLMCache.cache_key(*base[:4], [{"role": "user", "content": "b"}]) != key
+
+
+class TestLLMCache:
+    """Тесты get/set и статистики"""
+
+    def test_hit_and_miss(self):
+        """Тест попадания и промаха"""
+        cache = LLMCache()
+
+        async def scenario():
+            assert await cache.get("key") is None
+            await cache.set("key", "value")
+            assert await cache.get("key") == "value"
+
+        asyncio.run(scenario())
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_lru_eviction(self):
+        """Тест вытеснения самой старой записи"""
+        backend = MemoryBackend(max_entries=2)
+
+        async def scenario():
+            await backend.set("a", "1")
+            await backend.set("b", "2")
+            await backend.get("a")
+            await backend.set("c", "3")
+            return [await backend.get(key) for key in ("a", "b", "c")]
+
+        assert asyncio.run(scenario()) == ["1", None, "3"]
+
+    def test_ttl_expiry(self):
+        """Тест что просроченные записи не возвращаются"""
+        backend = MemoryBackend(ttl=-1)
+
+        async def scenario():
+            await backend.set("key", "value")
+            return await backend.get("key")
+
+        assert asyncio.run(scenario()) is None
+
+
+class TestFileBackend:
+    """Тесты персистентного кэша на диске"""
+
+    def test_persists_between_instances(self, tmp_path):
+        """Тест что значение читается новым экземпляром (после перезапуска)"""
+        cache_dir = tmp_path / "llm_cache"
+
+        asyncio.run(FileBackend(cache_dir, suffix=".yaml").set("key", "kind: Deployment\n"))
+
+        backend = FileBackend(cache_dir, suffix=".yaml")
+        assert asyncio.run(backend.get("key")) == "kind: Deployment\n"
+        assert asyncio.run(backend.get("missing")) is None
+        assert [p.name for p in cache_dir.iterdir()] == ["key.yaml"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,328 @@
+"""
+Unit тесты для SecurityAnalyzer
+Тестирование базовых security проверок
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from src.mcp_server.llm.cache import LLMCache
+from src.mcp_server.tools import security_analyzer
+from src.mcp_server.tools.security_analyzer import SecurityAnalyzer, _ContainerView
+
+
+DEPLOYMENT = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: upf
+spec:
+  template:
+    spec:
+      hostNetwork: true
+      securityContext:
+        runAsNonRoot: true
+      containers:
+      - name: main
+        image: registry.mts.ru/upf:1.0
+        securityContext:
+          privileged: true
+        resources:
+          limits:
+            cpu: "2"
+        env:
+        - name: DB_PASSWORD
+          value: hunter2
+"""
+
+
+class TestSecurityAnalyzer:
+    """Тесты анализатора безопасности"""
+
+    @pytest.fixture
+    def analyzer(self):
+        """Фикстура с анализатором без реального LLM"""
+        class MockSecurityAnalyzer(SecurityAnalyzer):
+            def __init__(self):
+                self._parse_cache = OrderedDict()
+                self._parse_lock = threading.Lock()
+
+        return MockSecurityAnalyzer()
+
+    def test_basic_checks(self, analyzer):
+        """Тест базовых проверок Deployment"""
+        manifests = {
+            "deployment.yaml": DEPLOYMENT,
+            "np.yaml": "apiVersion: networking.k8s.io/v1\nkind: NetworkPolicy\nmetadata:\n  name: deny\n"
+        }
+        checks = analyzer._run_basic_checks(analyzer._parse_all(manifests))
+
+        assert checks["security_context_present"]
+        assert checks["run_as_non_root"]
+        assert checks["privileged_containers"] == ["upf/main"]
+        assert checks["host_network_usage"] == ["upf"]
+        assert checks["secrets_in_env"] == ["upf/main: DB_PASSWORD"]
+        assert checks["resource_limits_set"]
+        assert checks["trusted_registry"] == ["registry.mts.ru/upf:1.0"]
+        assert checks["network_policies_present"]
+
+    def test_secrets_in_env_keywords(self, analyzer):
+        """Тест поиска hardcoded секретов в env (без учёта регистра)"""
+        manifest = """
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: billing
+spec:
+  template:
+    spec:
+      containers:
+      - name: app
+        env:
+        - name: api_token
+          value: abc
+        - name: STRIPE_KEY
+          value: def
+        - name: DB_PASSWORD
+          valueFrom:
+            secretKeyRef:
+              name: db
+              key: password
+        - name: LOG_LEVEL
+          value: INFO
+        - name: PGPASSWORD
+          value: ghi
+        - name: DBPASSWORD
+          value: jkl
+        - name: CLIENTSECRET
+          value: mno
+        - name: DJANGO_SECRETKEY
+          value: pqr
+        - name: KEYCLOAK_URL
+          value: https://sso.mts.ru
+        - name: KEYSPACE
+          value: billing
+        - name: MONKEY_MODE
+          value: "off"
+        - name: SSL_KEY_PATH
+          value: /etc/ssl/tls.key
+        - name: TOKEN_TTL_SECONDS
+          value: "3600"
+"""
+        checks = analyzer._run_basic_checks(analyzer._parse_all({"deployment.yaml": manifest}))
+
+        # SECRET/PASSWORD - в любом месте имени; TOKEN/KEY внутри другого
+        # слова или не в конце имени - не секрет
+        assert checks["secrets_in_env"] == [
+            "billing/app: CLIENTSECRET",
+            "billing/app: DBPASSWORD",
+            "billing/app: DJANGO_SECRETKEY",
+            "billing/app: PGPASSWORD",
+            "billing/app: STRIPE_KEY",
+            "billing/app: api_token"
+        ]
+
+    def test_trusted_registry_prefix(self, analyzer):
+        """Тест: доверенный registry определяется по префиксу образа"""
+        manifest = DEPLOYMENT.replace(
+            "image: registry.mts.ru/upf:1.0",
+            "image: evil.io/registry.mts.ru/upf:1.0"
+        )
+        checks = analyzer._run_basic_checks(analyzer._parse_all({"deployment.yaml": manifest}))
+
+        assert checks["trusted_registry"] == []
+        assert checks["image_pull_policy"] == ["upf: evil.io/registry.mts.ru/upf:1.0"]
+
+    def test_list_checks_deduplicated(self, analyzer):
+        """Тест: одинаковые находки из разных файлов не дублируются"""
+        manifests = {"a.yaml": DEPLOYMENT, "b.yaml": DEPLOYMENT + "\n"}
+        checks = analyzer._run_basic_checks(analyzer._parse_all(manifests))
+
+        assert checks["privileged_containers"] == ["upf/main"]
+        assert checks["trusted_registry"] == ["registry.mts.ru/upf:1.0"]
+        assert isinstance(checks["capabilities_added"], list)
+
+    def test_parse_all_skips_invalid_and_caches(self, analyzer):
+        """Тест: невалидные и не-.yaml файлы пропускаются, разбор кэшируется"""
+        manifests = {
+            "deployment.yaml": DEPLOYMENT,
+            "bad.yaml": "a: [1, 2\n",
+            "README.md": "# docs"
+        }
+
+        parsed = analyzer._parse_all(manifests)
+        assert list(parsed) == ["deployment.yaml"]
+
+        again = analyzer._parse_all(manifests)
+        assert again["deployment.yaml"] is parsed["deployment.yaml"]
+
+    def test_parse_large_bundle_off_loop(self, analyzer, monkeypatch):
+        """Тест: большие наборы разбираются вне потока event loop"""
+        monkeypatch.setattr(security_analyzer, "_PARSE_THREAD_THRESHOLD", 0)
+        threads = []
+        parse_all = analyzer._parse_all
+
+        def recording_parse_all(manifests):
+            threads.append(threading.get_ident())
+            return parse_all(manifests)
+
+        analyzer._parse_all = recording_parse_all
+        parsed = asyncio.run(analyzer._parse({"deployment.yaml": DEPLOYMENT}))
+
+        assert list(parsed) == ["deployment.yaml"]
+        assert threads and threads[0] != threading.get_ident()
+
+    def test_summarize_for_security(self, analyzer):
+        """Тест summary для LLM"""
+        summary = analyzer._summarize_for_security(analyzer._parse_all({"deployment.yaml": DEPLOYMENT}))
+
+        assert len(summary) == 1
+        assert summary[0]["name"] == "upf"
+        assert summary[0]["serviceAccount"] == "default"
+        assert summary[0]["hasResourceLimits"] is True
+
+    def test_evaluate(self, analyzer):
+        """Тест расчёта score, оценки и compliance"""
+        secure_checks = {
+            "security_context_present": True,
+            "run_as_non_root": True,
+            "privileged_containers": [],
+            "host_network_usage": [],
+            "secrets_in_env": [],
+            "resource_limits_set": True,
+            "network_policies_present": True,
+            "service_account_set": True
+        }
+        score, grade, compliance = analyzer._evaluate(secure_checks, {"critical_issues": [], "warnings": []})
+
+        assert score == 100
+        assert grade == "A (Отлично)"
+        assert all(compliance.values())
+
+        score, grade, compliance = analyzer._evaluate({}, {"critical_issues": [{}], "warnings": [{}]})
+
+        # -15 critical, -5 warning, -10 x4 за отсутствие базовых мер
+        assert score == 40
+        assert grade == "D (Требуется улучшение)"
+        assert not any(compliance.values())
+
+    def test_llm_analysis_cached(self, analyzer):
+        """Тест: повторный анализ тех же манифестов не вызывает LLM"""
+        calls = []
+
+        class FakeMessages:
+            async def create(self, **kwargs):
+                calls.append(kwargs)
+                text = '```json\n{"critical_issues": [], "warnings": []}\n```'
+                return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+        analyzer.llm = SimpleNamespace(messages=FakeMessages())
+        analyzer.model = "test-model"
+        analyzer.cache = LLMCache()
+
+        parsed = analyzer._parse_all({"deployment.yaml": DEPLOYMENT})
+        checks = analyzer._run_basic_checks(parsed)
+
+        first = asyncio.run(analyzer._llm_security_analysis(parsed, checks))
+        second = asyncio.run(analyzer._llm_security_analysis(parsed, checks))
+
+        assert first == second == {"critical_issues": [], "warnings": []}
+        assert len(calls) == 1
+        assert analyzer.cache.hits == 1
+
+    def test_analyze_security_batch(self, analyzer):
+        """Тест batch анализа: один batch на некэшированные наборы, порядок сохраняется"""
+        from anthropic.types import TextBlock
+
+        submitted = []
+
+        class FakeResults:
+            def __init__(self, entries):
+                self.entries = entries
+
+            def __aiter__(self):
+                return self._iter()
+
+            async def _iter(self):
+                for entry in self.entries:
+                    yield entry
+
+        class FakeBatches:
+            async def create(self, requests):
+                submitted.extend(requests)
+                return SimpleNamespace(id="batch-1", processing_status="ended")
+
+            async def results(self, batch_id):
+                text = '{"critical_issues": [{"issue": "privileged container"}], "warnings": []}'
+                message = SimpleNamespace(content=[TextBlock(type="text", text=text)])
+                return FakeResults([
+                    SimpleNamespace(custom_id="bundle-0", result=SimpleNamespace(type="succeeded", message=message)),
+                    SimpleNamespace(custom_id="bundle-1", result=SimpleNamespace(type="errored"))
+                ])
+
+        analyzer.llm = SimpleNamespace(messages=SimpleNamespace(batches=FakeBatches()))
+        analyzer.model = "test-model"
+        analyzer.cache = LLMCache()
+
+        reports = asyncio.run(analyzer.analyze_security_batch([
+            {"deployment.yaml": DEPLOYMENT},
+            {"np.yaml": "apiVersion: networking.k8s.io/v1\nkind: NetworkPolicy\nmetadata:\n  name: deny\n"}
+        ]))
+
+        assert [request["custom_id"] for request in submitted] == ["bundle-0", "bundle-1"]
+        assert [report["status"] for report in reports] == ["analyzed", "analyzed"]
+        assert reports[0]["auto_fixes"][0]["fix_type"] == "remove_privileged"
+        assert reports[1]["critical_issues"] == []
+        assert "LLM анализ не удался" in reports[1]["warnings"][0]["warning"]
+
+    def test_parse_llm_response(self, analyzer):
+        """Тест разбора ответа LLM: чистый JSON и JSON в markdown блоке"""
+        analyzer.cache = LLMCache()
+        expected = {"critical_issues": [{"issue": "x"}], "warnings": []}
+
+        raw = '{"critical_issues": [{"issue": "x"}], "warnings": []}'
+        fenced = f"Результат анализа:\n```json\n{raw}\n```\nКонец"
+        bare_fence = f"```\n{raw}\n```"
+
+        for content in (raw, fenced, bare_fence):
+            assert asyncio.run(analyzer._parse_llm_response(content, "key")) == expected
+
+        with pytest.raises(ValueError):
+            asyncio.run(analyzer._parse_llm_response("Не удалось проанализировать", "key"))
+
+    def test_container_view(self):
+        """Тест view контейнера: значения по умолчанию и сериализуемый summary"""
+        view = _ContainerView.from_raw({"name": "app"})
+
+        assert view.image == ""
+        assert view.has_limits is False
+        assert dict(view.security_context) == {}
+        assert not hasattr(view, "__dict__")
+
+        view = _ContainerView.from_raw({"name": "app", "securityContext": None, "resources": None})
+        assert dict(view.security_context) == {}
+        assert view.has_limits is False
+
+    def test_summarize_null_security_context(self, analyzer):
+        """Тест: securityContext: null не выкидывает файл из summary"""
+        manifest = DEPLOYMENT.replace(
+            "        securityContext:\n          privileged: true\n",
+            "        securityContext: null\n"
+        )
+        summary = analyzer._summarize_for_security(analyzer._parse_all({"deployment.yaml": manifest}))
+
+        assert len(summary) == 1
+        assert summary[0]["containerSecurityContext"] == {}
+
+    def test_determine_fix_type(self, analyzer):
+        """Тест типа исправления: приоритет правил, а не позиция в тексте"""
+        assert analyzer._determine_fix_type({"issue": "Privileged container without Security Context"}) == "add_security_context"
+        assert analyzer._determine_fix_type({"issue": "Hardcoded PASSWORD in env"}) == "move_to_secret"
+        assert analyzer._determine_fix_type({"issue": "Missing resource limits"}) == "add_resource_limits"
+        assert analyzer._determine_fix_type({"issue": "Unknown"}) == "manual_review_required"
+        assert analyzer._determine_fix_type({}) == "manual_review_required"
+        assert analyzer._is_auto_fixable("add_network_policy")
+        assert not analyzer._is_auto_fixable("move_to_secret")